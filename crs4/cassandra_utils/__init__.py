@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from crs4.cassandra_utils._list_manager import ListManager
+from crs4.cassandra_utils._list_manager import ListManager, convert_rows_file
 from crs4.cassandra_utils._mini_list_manager import MiniListManager
 from crs4.cassandra_utils._cassandra_config import CassandraConf
 from crs4.cassandra_utils._cassandra_writer import CassandraWriter
@@ -23,3 +23,15 @@ from crs4.cassandra_utils._cassandra_segmentation_writer import (
     CassandraSegmentationWriter,
 )
 from crs4.cassandra_utils._sharding import get_shard
+from crs4.cassandra_utils._permutation import permute_index
+from crs4.cassandra_utils._token_scan import (
+    scan_table,
+    scan_keys,
+    scan_columns,
+)
+from crs4.cassandra_utils._uuid_file import save_uuids_file, load_uuids_file
+from crs4.cassandra_utils._split_file import save_split_file, load_split_file
+from crs4.cassandra_utils._replica_affinity import get_replica_affinity
+from crs4.cassandra_utils._tensor_payload import encode_tensor, decode_tensor
+from crs4.cassandra_utils._ingest import ingest
+from crs4.cassandra_utils._manifest import IngestManifest, path_uuid, content_uuid
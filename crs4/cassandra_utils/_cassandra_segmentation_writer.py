@@ -14,7 +14,6 @@
 
 import cassandra
 from cassandra import concurrent
-import uuid
 
 from crs4.cassandra_utils._cassandra_writer import CassandraWriter
 from crs4.cassandra_utils._cassandra_session import CassandraSession
@@ -33,6 +32,13 @@ class CassandraSegmentationWriter(CassandraWriter):
         get_data,
         metadata_id_col=None,
         metadata_label_col=None,
+        max_inflight=0,
+        max_inflight_bytes=64 * 2**20,
+        deterministic_ids=False,
+        manifest=None,
+        save_mode="async",
+        size_col=None,
+        checksum_col=None,
     ):
         super().__init__(
             cass_conf=cass_conf,
@@ -45,6 +51,13 @@ class CassandraSegmentationWriter(CassandraWriter):
             data_col=data_col,
             cols=cols,
             get_data=get_data,
+            max_inflight=max_inflight,
+            max_inflight_bytes=max_inflight_bytes,
+            deterministic_ids=deterministic_ids,
+            manifest=manifest,
+            save_mode=save_mode,
+            size_col=size_col,
+            checksum_col=checksum_col,
         )
         self.queue_data = []
         self.queue_meta = []
@@ -55,33 +68,45 @@ class CassandraSegmentationWriter(CassandraWriter):
         query_data += (
             f"{self.data_id_col}, {self.data_label_col}, {self.data_col}) VALUES (?,?,?)"
         )
+        cols = list(self.cols) + self.stat_cols()
         query_meta = f"INSERT INTO {self.metadata_table} ("
-        query_meta += f"{self.metadata_id_col}, {', '.join(self.cols)}) "
-        query_meta += f"VALUES ({', '.join(['?']*(len(self.cols)+1))})"
+        query_meta += f"{self.metadata_id_col}, {', '.join(cols)}) "
+        query_meta += f"VALUES ({', '.join(['?']*(len(cols)+1))})"
 
         self.prep_data = self.sess.prepare(query_data)
         self.prep_meta = self.sess.prepare(query_meta)
 
     def save_item(self, item):
         image_id, label, data, partition_items = item
-        stuff = (image_id, *partition_items)
-        
-        batch = BatchStatement()
-        # insert metadata
-        batch.add(self.prep_meta, stuff)
-        # insert heavy data
-        batch.add(self.prep_data, (image_id, label, data))
-        
-        self.sess.execute(batch, execution_profile="tuple", timeout=30)
+        stuff_meta = (image_id, *partition_items, *self.stat_values(data))
+        stuff_data = (image_id, label, data)
+        self.write_item(stuff_meta, stuff_data)
+        self.commit_ids([image_id])
 
     def enqueue_item(self, item):
         image_id, label, data, partition_items = item
-        stuff_meta = (image_id, *partition_items)
+        stuff_meta = (image_id, *partition_items, *self.stat_values(data))
         stuff_data = (image_id, label, data)
+        if self.max_inflight:
+            # send right away, overlapping writes with reading the next items
+            self.write_async_item(
+                image_id,
+                [
+                    (self.prep_data, stuff_data, len(data) + len(label)),
+                    (self.prep_meta, stuff_meta, 0),
+                ],
+            )
+            return
         self.queue_meta += (stuff_meta,)
         self.queue_data += (stuff_data,)
+        if len(self.queue_meta) >= self.concurrency:
+            self.send_enqueued()
 
     def send_enqueued(self):
+        if self.max_inflight:
+            self.flush()
+            return
+        ids = [m[0] for m in self.queue_meta]
         if self.queue_data:
             cassandra.concurrent.execute_concurrent_with_args(
                 self.sess, self.prep_data, self.queue_data
@@ -92,12 +117,13 @@ class CassandraSegmentationWriter(CassandraWriter):
                 self.sess, self.prep_meta, self.queue_meta, concurrency=self.concurrency
             )
             self.queue_meta = []
+        self.commit_ids(ids)
 
     def save_image(self, path, label, partition_items):
         # read file into memory
         data = self.get_data(path)
         label = self.get_data(label)
-        image_id = uuid.uuid4()
+        image_id = self.new_id(path)
         item = (image_id, label, data, partition_items)
         self.save_item(item)
 
@@ -105,8 +131,6 @@ class CassandraSegmentationWriter(CassandraWriter):
         # read file into memory
         data = self.get_data(path)
         label = self.get_data(label)
-        image_id = uuid.uuid4()
+        image_id = self.new_id(path)
         item = (image_id, label, data, partition_items)
         self.enqueue_item(item)
-        if len(self.queue_meta) % self.concurrency == 0:
-            self.send_enqueued()
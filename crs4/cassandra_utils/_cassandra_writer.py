@@ -12,7 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from cassandra.query import BatchStatement, BatchType
+import threading
+import uuid
+import zlib
+
 from crs4.cassandra_utils._cassandra_session import CassandraSession
+from crs4.cassandra_utils._manifest import IngestManifest, path_uuid
 
 
 class CassandraWriter:
@@ -28,6 +34,13 @@ class CassandraWriter:
         get_data,
         metadata_id_col=None,
         metadata_label_col=None,
+        max_inflight=0,
+        max_inflight_bytes=64 * 2**20,
+        deterministic_ids=False,
+        manifest=None,
+        save_mode="async",
+        size_col=None,
+        checksum_col=None,
     ):
         self.get_data = get_data
         self.data_table = data_table
@@ -47,9 +60,38 @@ class CassandraWriter:
         
         self.data_col = data_col
         self.cols = cols
+        # optional metadata columns with size and crc32 of the data
+        self.size_col = size_col
+        self.checksum_col = checksum_col
         self._cs = CassandraSession(cass_conf)
         self.sess = self._cs.sess
 
+        # how save_item writes the two inserts of an item: as independent
+        # concurrent writes ("async"), or in a "unlogged" or "logged" batch
+        if save_mode not in ("async", "unlogged", "logged"):
+            raise ValueError(f"Unknown save_mode: {save_mode}")
+        self.save_mode = save_mode
+
+        # asynchronous writes (if max_inflight > 0): a window of at most
+        # max_inflight inserts (and max_inflight_bytes of payload) is
+        # kept in flight, and refilled as the driver completes them
+        self.max_inflight = max_inflight
+        self.max_inflight_bytes = max_inflight_bytes
+        self._inflight = 0
+        self._inflight_bytes = 0
+        self._write_error = None
+        self._window = threading.Condition()
+
+        # resumable ingestion: ids derived from the source paths, and
+        # recorded in the manifest once committed
+        self.deterministic_ids = deterministic_ids
+        if isinstance(manifest, str):
+            manifest = IngestManifest(manifest)
+        self.manifest = manifest
+        self._pending = {}  # outstanding async writes of each id
+        self._committed = []
+        self._failed = set()
+
         # Query and session prepare have to be implemented
         # in subclasses set_query() method as well as
         # session execute in subclass save_item method
@@ -62,3 +104,155 @@ class CassandraWriter:
     def save_item(self, item):
         # insert metadata and heavy data
         pass
+
+    def stat_cols(self):
+        # names of the optional size and checksum columns
+        return [c for c in (self.size_col, self.checksum_col) if c]
+
+    def stat_values(self, data):
+        # values of the optional size and checksum columns
+        vals = []
+        if self.size_col:
+            vals.append(len(data))
+        if self.checksum_col:
+            # as a signed CQL int
+            crc = zlib.crc32(data)
+            vals.append(crc - 2**32 if crc >= 2**31 else crc)
+        return vals
+
+    def write_item(self, stuff_meta, stuff_data):
+        # insert metadata and heavy data of a single item
+        if self.save_mode == "async":
+            futures = [
+                self.sess.execute_async(
+                    prep, args, execution_profile="tuple", timeout=30
+                )
+                for prep, args in (
+                    (self.prep_meta, stuff_meta),
+                    (self.prep_data, stuff_data),
+                )
+            ]
+            for future in futures:
+                future.result()
+            return
+        if self.save_mode == "logged":
+            batch = BatchStatement(batch_type=BatchType.LOGGED)
+        else:
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        batch.add(self.prep_meta, stuff_meta)
+        batch.add(self.prep_data, stuff_data)
+        self.sess.execute(batch, execution_profile="tuple", timeout=30)
+
+    def new_id(self, path):
+        # deterministic ids allow resuming an interrupted ingestion
+        if self.deterministic_ids:
+            return path_uuid(path)
+        return uuid.uuid4()
+
+    def commit_ids(self, ids):
+        # record committed ids in the manifest, if any
+        if self.manifest is not None:
+            self.manifest.add(ids)
+
+    def write_async(self, prep, args, nbytes=0, item_id=None):
+        """Start an insert, waiting for room in the in-flight window"""
+        if item_id is not None:
+            with self._window:
+                self._pending[item_id] = self._pending.get(item_id, 0) + 1
+        self._start_write(prep, args, nbytes, item_id)
+
+    def write_async_item(self, item_id, writes):
+        """Start all the inserts of an item
+
+        All the inserts are registered before sending any, so that the
+        item is committed only after every one of them has succeeded.
+
+        :param item_id: Id of the item
+        :param writes: List of (prepared statement, args, nbytes)
+
+        """
+        with self._window:
+            self._pending[item_id] = self._pending.get(item_id, 0) + len(writes)
+        sent = 0
+        try:
+            for prep, args, nbytes in writes:
+                self._start_write(prep, args, nbytes, item_id)
+                sent += 1
+        except BaseException:
+            # the unsent inserts will never complete
+            with self._window:
+                self._failed.add(item_id)
+                self._release(item_id, len(writes) - sent)
+            raise
+
+    def _start_write(self, prep, args, nbytes, item_id):
+        committed = None
+        with self._window:
+            # a single write is always admitted, even if larger than the window
+            self._window.wait_for(
+                lambda: self._write_error is not None
+                or self._inflight == 0
+                or (
+                    self._inflight < self.max_inflight
+                    and self._inflight_bytes + nbytes <= self.max_inflight_bytes
+                )
+            )
+            self._raise_write_error()
+            self._inflight += 1
+            self._inflight_bytes += nbytes
+            if len(self._committed) >= self.max_inflight:
+                committed, self._committed = self._committed, []
+        if committed:
+            self.commit_ids(committed)
+        future = self.sess.execute_async(
+            prep, args, execution_profile="tuple", timeout=30
+        )
+        future.add_callbacks(
+            self._write_done,
+            self._write_failed,
+            callback_args=(nbytes, item_id),
+            errback_args=(nbytes, item_id),
+        )
+
+    def flush(self):
+        """Wait for all the in-flight inserts to complete"""
+        with self._window:
+            self._window.wait_for(lambda: self._inflight == 0)
+            self._raise_write_error()
+            committed, self._committed = self._committed, []
+        self.commit_ids(committed)
+
+    def _write_done(self, _, nbytes, item_id, error=None):
+        # called by the driver event loop: must not block
+        with self._window:
+            self._inflight -= 1
+            self._inflight_bytes -= nbytes
+            if error is not None and self._write_error is None:
+                self._write_error = error
+            if item_id is not None:
+                if error is not None:
+                    # items with a failed write are never recorded
+                    self._failed.add(item_id)
+                self._release(item_id, 1)
+            self._window.notify_all()
+
+    def _release(self, item_id, n):
+        # to be called holding self._window: n writes of item_id are over
+        left = self._pending[item_id] - n
+        if left > 0:
+            self._pending[item_id] = left
+        else:
+            del self._pending[item_id]
+            if item_id in self._failed:
+                self._failed.discard(item_id)
+            else:
+                self._committed.append(item_id)
+
+    def _write_failed(self, error, nbytes, item_id):
+        self._write_done(None, nbytes, item_id, error=error)
+
+    def _raise_write_error(self):
+        # to be called holding self._window
+        if self._write_error is not None:
+            error, self._write_error = self._write_error, None
+            raise error
@@ -0,0 +1,223 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+
+# fields of an item: (image_id, label, data, partition_items)
+_blob_fields = (1, 2)  # label and data, when they are bytes
+
+
+def _worker(rank, jobs_q, out_q, free_q, stats_q, shm_name, slot_size, get_item):
+    # decode and encode items, handing them off via shared memory
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        while True:
+            jobs = jobs_q.get()
+            if jobs is None:
+                break
+            for job in jobs:
+                item = list(get_item(job))
+                blobs = [
+                    (f, item[f]) for f in _blob_fields if isinstance(item[f], bytes)
+                ]
+                nbytes = sum(len(b) for _, b in blobs)
+                if nbytes > slot_size:
+                    # too large for a slot, pickle it through the queue
+                    out_q.put((rank, None, item, []))
+                    continue
+                slot = free_q.get()
+                off = slot * slot_size
+                layout = []
+                for f, b in blobs:
+                    shm.buf[off : off + len(b)] = b
+                    layout.append((f, off, len(b)))
+                    item[f] = None
+                    off += len(b)
+                out_q.put((rank, slot, item, layout))
+        shm.close()
+        # make sure all items are in the queue before signaling
+        out_q.close()
+        out_q.join_thread()
+        stats_q.put(("done",))
+    except Exception:
+        stats_q.put(("error", traceback.format_exc()))
+
+
+def _writer(out_q, free_qs, stats_q, shm_names, make_writer, report_every):
+    # write items to Cassandra, returning slots to the workers
+    try:
+        shms = [shared_memory.SharedMemory(name=n) for n in shm_names]
+        cw = make_writer()
+        count = nbytes = 0
+        while True:
+            msg = out_q.get()
+            if msg is None:
+                break
+            rank, slot, item, layout = msg
+            for f, off, n in layout:
+                item[f] = bytes(shms[rank].buf[off : off + n])
+            if slot is not None:
+                free_qs[rank].put(slot)
+            cw.enqueue_item(tuple(item))
+            count += 1
+            nbytes += sum(
+                len(item[f]) for f in _blob_fields if isinstance(item[f], bytes)
+            )
+            if count == report_every:
+                stats_q.put(("stats", count, nbytes))
+                count = nbytes = 0
+        cw.send_enqueued()
+        stats_q.put(("stats", count, nbytes))
+        for shm in shms:
+            shm.close()
+        stats_q.put(("end",))
+    except Exception:
+        stats_q.put(("error", traceback.format_exc()))
+
+
+def ingest(
+    jobs,
+    get_item,
+    make_writer,
+    num_procs=None,
+    num_writers=1,
+    slot_size=4 * 2**20,
+    slots_per_proc=8,
+    chunk_size=16,
+    progress=True,
+):
+    """Ingest a dataset using a pool of processes and a few writers
+
+    Each job is turned into an item by ``get_item`` in one of
+    ``num_procs`` worker processes (e.g., reading, resizing and
+    encoding an image). Encoded data is handed off via shared memory
+    to ``num_writers`` writer processes, each writing with its own
+    writer, as created by ``make_writer``. Processes are forked, so
+    ``get_item`` and ``make_writer`` can be closures.
+
+    :param jobs: List of jobs (e.g., tuples of path, label and
+                 partition items)
+    :param get_item: Function mapping a job to an item
+                     ``(image_id, label, data, partition_items)``,
+                     as accepted by the ``enqueue_item`` method of
+                     the writers
+    :param make_writer: Function returning a new writer (e.g., a
+                        CassandraClassificationWriter)
+    :param num_procs: Number of worker processes (default: number of CPUs)
+    :param num_writers: Number of writer processes
+    :param slot_size: Size of shared memory slots, larger items are
+                      pickled through a queue
+    :param slots_per_proc: Number of slots for each worker, bounding
+                           the items waiting to be written
+    :param chunk_size: Number of jobs sent to a worker at a time
+    :param progress: Show a progress bar (requires tqdm)
+    :returns: Number of items and bytes written
+    :rtype: tuple
+
+    """
+    if num_procs is None:
+        num_procs = os.cpu_count()
+    ctx = mp.get_context("fork")
+    jobs_q = ctx.Queue()
+    out_q = ctx.Queue(maxsize=num_procs * slots_per_proc)
+    stats_q = ctx.Queue()
+    free_qs = [ctx.Queue() for _ in range(num_procs)]
+    shms = [
+        shared_memory.SharedMemory(create=True, size=slot_size * slots_per_proc)
+        for _ in range(num_procs)
+    ]
+    for free_q in free_qs:
+        for slot in range(slots_per_proc):
+            free_q.put(slot)
+    for i in range(0, len(jobs), chunk_size):
+        jobs_q.put(jobs[i : i + chunk_size])
+    for _ in range(num_procs):
+        jobs_q.put(None)
+    workers = [
+        ctx.Process(
+            target=_worker,
+            args=(
+                rank, jobs_q, out_q, free_qs[rank], stats_q,
+                shms[rank].name, slot_size, get_item,
+            ),
+        )
+        for rank in range(num_procs)
+    ]
+    writers = [
+        ctx.Process(
+            target=_writer,
+            args=(
+                out_q, free_qs, stats_q, [shm.name for shm in shms],
+                make_writer, chunk_size,
+            ),
+        )
+        for _ in range(num_writers)
+    ]
+    procs = workers + writers
+    for p in procs:
+        p.start()
+    if progress:
+        from tqdm import tqdm
+
+        pbar = tqdm(total=len(jobs), unit="img")
+    count = nbytes = 0
+    start = time.perf_counter()
+    workers_done = writers_done = 0
+    try:
+        while writers_done < num_writers:
+            try:
+                msg = stats_q.get(timeout=1)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in procs):
+                    raise RuntimeError("Ingestion process died unexpectedly")
+                continue
+            if msg[0] == "error":
+                raise RuntimeError(f"Ingestion failed:\n{msg[1]}")
+            elif msg[0] == "done":
+                workers_done += 1
+                if workers_done == num_procs:
+                    # all items produced, stop the writers
+                    for _ in range(num_writers):
+                        out_q.put(None)
+            elif msg[0] == "end":
+                writers_done += 1
+            else:
+                _, n, b = msg
+                count += n
+                nbytes += b
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    pbar.set_postfix(MBps=f"{nbytes / elapsed / 2**20:.1f}")
+                    pbar.update(n)
+    finally:
+        if progress:
+            pbar.close()
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Ingested {count} items, {nbytes / 2**20:.1f} MB in {elapsed:.1f} s "
+        f"({count / elapsed:.1f} items/s, {nbytes / elapsed / 2**20:.1f} MB/s)"
+    )
+    return count, nbytes
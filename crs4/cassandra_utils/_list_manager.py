@@ -14,6 +14,12 @@
 
 import pickle
 
+from crs4.cassandra_utils._uuid_file import (
+    is_uuids_file,
+    load_uuids_file,
+    save_uuids_file,
+)
+
 
 class ListManager:
     def __init__(self):
@@ -21,12 +27,16 @@ class ListManager:
         """List of all UUIDs"""
         self.split = None
         """List of lists of indexes (pointing to row_keys list)"""
+        self.sizes = None
+        """Optional list of data sizes, one per UUID"""
+        self.checksums = None
+        """Optional list of data crc32 checksums, one per UUID"""
 
     def get_config(self):
         """Return dictionary with configuration"""
         pass
 
-    def set_config(self):
+    def set_config(self, conf):
         """Apply saved configuration"""
         pass
 
@@ -36,20 +46,23 @@ class ListManager:
             "row_keys": self.row_keys,
             "config": self.get_config(),
             "split": self.split,
+            "sizes": self.sizes,
+            "checksums": self.checksums,
         }
         return stuff
 
     def save_rows(self, filename):
         """Save full list of DB rows to file
 
+        The file is a binary uuid file (see save_uuids_file), which
+        can also be passed directly to the reader as ``uuids_file``.
+
         :param filename: Local filename, as string
         :returns:
         :rtype:
 
         """
-        stuff = self.get_rows()
-        with open(filename, "wb") as f:
-            pickle.dump(stuff, f)
+        _save_rows(filename, self.get_rows())
 
     def load_rows(self, filename):
         """Load full list of DB rows from file
@@ -60,10 +73,57 @@ class ListManager:
 
         """
         print("Loading rows...")
-        with open(filename, "rb") as f:
-            stuff = pickle.load(f)
+        stuff = _load_rows(filename)
 
         self.row_keys = stuff["row_keys"]
         self.split = stuff["split"]
+        self.sizes = stuff.get("sizes")
+        self.checksums = stuff.get("checksums")
         conf = stuff["config"]
         self.set_config(conf)
+
+
+def _save_rows(filename, stuff):
+    # config and split go in the JSON metadata, the rest in columns
+    split = stuff["split"]
+    if split is not None:
+        split = [[int(i) for i in s] for s in split]
+    meta = {"rows": {"config": stuff["config"], "split": split}}
+    save_uuids_file(
+        filename,
+        stuff["row_keys"],
+        sizes=stuff.get("sizes"),
+        checksums=stuff.get("checksums"),
+        meta=meta,
+    )
+
+
+def _load_rows(filename):
+    if not is_uuids_file(filename):
+        # legacy pickled rows
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    uf = load_uuids_file(filename)
+    rows = uf["meta"].get("rows", {})
+    stuff = {
+        "row_keys": uf["keys"],  # memory-mapped (N, 2) uint64 array
+        "config": rows.get("config"),
+        "split": rows.get("split"),
+        "sizes": uf["sizes"],
+        "checksums": uf["checksums"],
+    }
+    return stuff
+
+
+def convert_rows_file(src, dst):
+    """Convert a pickled rows file to the binary format
+
+    :param src: Pickled rows file, as saved by older versions
+    :param dst: Output filename
+    :returns:
+    :rtype:
+
+    """
+    with open(src, "rb") as f:
+        stuff = pickle.load(f)
+    _save_rows(dst, stuff)
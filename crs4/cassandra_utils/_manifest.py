@@ -0,0 +1,100 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import uuid
+
+# namespace of the deterministic ids
+INGEST_NAMESPACE = uuid.UUID("8e7d5cf5-3f3c-5b5e-9a8e-63b1d0c2a9a4")
+
+
+def path_uuid(path):
+    """Deterministic uuid of a source file, from its absolute path
+
+    :param path: Path of the source file
+    :returns: uuid5 of the path
+    :rtype: uuid.UUID
+
+    """
+    return uuid.uuid5(INGEST_NAMESPACE, os.path.abspath(path))
+
+
+def content_uuid(data):
+    """Deterministic uuid of a blob, from its SHA-256 digest
+
+    :param data: Content, as bytes
+    :returns: uuid5 of the content hash
+    :rtype: uuid.UUID
+
+    """
+    return uuid.uuid5(INGEST_NAMESPACE, hashlib.sha256(data).hexdigest())
+
+
+class IngestManifest:
+    """Local record of the items already committed to the DB
+
+    The ids of written items are appended to a text file, one per
+    line, after each batch is committed. With deterministic ids
+    (e.g., ``path_uuid``) a restarted ingestion can skip the
+    items already written; since inserts are idempotent, items
+    written but not yet recorded are just written again.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.done = set()
+        if os.path.exists(filename):
+            with open(filename) as fh:
+                for line in fh:
+                    line = line.strip()
+                    # skip lines truncated by a crash
+                    if len(line) == 32:
+                        self.done.add(uuid.UUID(hex=line))
+
+    def __contains__(self, image_id):
+        return image_id in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, ids):
+        """Record a batch of committed ids
+
+        :param ids: List of uuid.UUID
+
+        """
+        if not ids:
+            return
+        buf = "".join(f"{i.hex}\n" for i in ids).encode()
+        # a single append, safe with multiple writer processes
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while buf:
+                buf = buf[os.write(fd, buf) :]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.done.update(ids)
+
+    def pending(self, jobs, get_id):
+        """Filter out the jobs already committed
+
+        :param jobs: List of jobs
+        :param get_id: Function mapping a job to its id
+        :returns: Jobs still to be done
+        :rtype: list
+
+        """
+        return [j for j in jobs if get_id(j) not in self.done]
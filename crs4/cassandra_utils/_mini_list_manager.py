@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import numpy as np
+
 from crs4.cassandra_utils._list_manager import ListManager
 from crs4.cassandra_utils._cassandra_session import CassandraSession
+from crs4.cassandra_utils._token_scan import scan_keys
 
 
 class MiniListManager(ListManager):
@@ -32,6 +35,8 @@ class MiniListManager(ListManager):
         self.sess = self._cs.sess
         self.table = None
         self.id_col = None
+        self.size_col = None
+        self.checksum_col = None
         self._rows = None
 
     def set_config(self, conf):
@@ -39,6 +44,8 @@ class MiniListManager(ListManager):
 
         :param table: Matadata table with ids
         :param id_col: Cassandra id column for the images (e.g., 'image_id')
+        :param size_col: Optional column with the data sizes (e.g., 'size')
+        :param checksum_col: Optional column with the data checksums (e.g., 'crc32')
         :returns:
         :rtype:
 
@@ -46,17 +53,52 @@ class MiniListManager(ListManager):
         super().__init__()
         self.table = conf["table"]
         self.id_col = conf["id_col"]
+        self.size_col = conf.get("size_col")
+        self.checksum_col = conf.get("checksum_col")
 
     def get_config(self):
         conf = {
             "table": self.table,
             "id_col": self.id_col,
+            "size_col": self.size_col,
+            "checksum_col": self.checksum_col,
         }
         return conf
 
-    def read_rows_from_db(self):
-        # get list of all rows
-        query = f"SELECT {self.id_col} FROM {self.table} ;"
-        res = self.sess.execute(query, execution_profile="tuple")
-        all_ids = res.all()
-        self.row_keys = list(map(lambda x: x[0], all_ids))
+    def read_rows_from_db(self, concurrency=16, num_ranges=None, progress=False):
+        """Read the list of all rows, scanning token ranges in parallel
+
+        :param concurrency: Number of token ranges scanned concurrently
+        :param num_ranges: Number of token ranges (default: 4 * concurrency)
+        :param progress: Show a progress bar (requires tqdm)
+        :returns:
+        :rtype:
+
+        """
+        cols = []
+        dtypes = []
+        if self.size_col:
+            cols.append(self.size_col)
+            dtypes.append(np.uint64)
+        if self.checksum_col:
+            cols.append(self.checksum_col)
+            dtypes.append(np.int32)
+        try:
+            res = scan_keys(
+                self.sess,
+                self.table,
+                self.id_col,
+                cols=cols,
+                dtypes=dtypes,
+                concurrency=concurrency,
+                num_ranges=num_ranges,
+                progress=progress,
+            )
+        except TypeError:
+            # None values can't be converted to numbers
+            raise ValueError(f"Missing values in {', '.join(cols)} column(s)")
+        self.row_keys = res[0]  # (N, 2) uint64 array
+        if self.size_col:
+            self.sizes = res[1]
+        if self.checksum_col:
+            self.checksums = res[-1]
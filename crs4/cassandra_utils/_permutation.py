@@ -0,0 +1,76 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+# Seeded permutation of [0, n), evaluated one index at a time: a
+# Feistel network over the smallest power of 4 not below n, restricted
+# to [0, n) by cycle walking. Must match crs4/cpp/permutation.h, so
+# that clients and the reader agree on the epoch order.
+
+_ROUNDS = 6
+_GOLDEN = 0x9E3779B97F4A7C15
+_M64 = 2**64 - 1
+
+
+def _mix(x):
+    # splitmix64 finalizer, on uint64 arrays (wrapping arithmetic)
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _round_keys(seed):
+    seed = np.array([seed & _M64], dtype=np.uint64)
+    golden = [np.uint64(((r + 1) * _GOLDEN) & _M64) for r in range(_ROUNDS)]
+    return [_mix(seed ^ g)[0] for g in golden]
+
+
+def permute_index(idx, n, seed):
+    """Map positions to a seeded permutation of [0, n)
+
+    The i-th element of the shuffled dataset is ``permute_index(i, n,
+    seed)``, computed in O(1) without materializing the permutation.
+
+    :param idx: Position, or array of positions, in [0, n)
+    :param n: Size of the dataset
+    :param seed: Seed of the permutation (e.g., seed + epoch)
+    :returns: Permuted positions
+    :rtype: numpy array of uint64
+
+    """
+    half = max(1, (int(n - 1).bit_length() + 1) // 2)
+    mask = np.uint64((1 << half) - 1)
+    shift = np.uint64(half)
+    keys = _round_keys(seed)
+
+    def encrypt(x):
+        left = x >> shift
+        right = x & mask
+        for k in keys:
+            left, right = right, left ^ (_mix(right ^ k) & mask)
+        return (left << shift) | right
+
+    x = np.array(idx, dtype=np.uint64)
+    scalar = x.ndim == 0
+    x = x.reshape(-1)
+    x = encrypt(x)
+    # cycle walking, values outside [0, n) are encrypted again
+    out = np.flatnonzero(x >= np.uint64(n))
+    while len(out) > 0:
+        x[out] = encrypt(x[out])
+        out = out[x[out] >= np.uint64(n)]
+    return x[0] if scalar else x
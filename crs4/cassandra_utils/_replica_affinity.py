@@ -0,0 +1,74 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cassandra.metadata import Murmur3Token
+import numpy as np
+import socket
+
+from crs4.cassandra_utils._cassandra_session import CassandraSession
+from crs4.cassandra_utils._sharding import uuids_to_keys, keys_to_bytes
+
+
+def _resolve(hosts):
+    if isinstance(hosts, str):
+        hosts = [hosts]
+    return {socket.gethostbyname(h) for h in hosts}
+
+
+def get_replica_affinity(cass_conf, keyspace, uuids, rank_hosts):
+    """Compute, for each uuid, a rank close to one of its replicas
+
+    The result can be saved as the affinity column of a uuids file,
+    to be used with the ``replica_affinity`` option of the reader.
+
+    :param cass_conf: Configuration for Cassandra
+    :param keyspace: Keyspace of the data table
+    :param uuids: List of uuid.UUID, or (N, 2) uint64 array of keys
+    :param rank_hosts: For each rank, the address (or list of
+                       addresses) of the Cassandra nodes close to it
+    :returns: Preferred rank of each uuid (-1 if none is close)
+    :rtype: numpy array of int32
+
+    """
+    cs = CassandraSession(cass_conf)
+    token_map = cs.cluster.metadata.token_map
+    if token_map.token_class is not Murmur3Token:
+        raise Exception("Only Murmur3Partitioner is supported")
+    rank_addrs = [_resolve(h) for h in rank_hosts]
+    # ranks close to the replicas of each token range
+    ring = token_map.ring
+    ring_tokens = np.array([t.value for t in ring], dtype=np.int64)
+    cands = []
+    for tok in ring:
+        replicas = {h.address for h in token_map.get_replicas(keyspace, tok)}
+        cands.append([r for r, addrs in enumerate(rank_addrs) if addrs & replicas])
+    num_cands = np.array([len(c) for c in cands], dtype=np.int64)
+    table = np.full((len(ring), max(1, num_cands.max())), -1, dtype=np.int32)
+    for i, c in enumerate(cands):
+        table[i, : len(c)] = c
+    # token range of each uuid
+    keys = uuids_to_keys(uuids)
+    key_bytes = keys_to_bytes(keys)
+    tokens = np.fromiter(
+        (Murmur3Token.hash_fn(kb.tobytes()) for kb in key_bytes),
+        dtype=np.int64,
+        count=len(key_bytes),
+    )
+    pos = np.searchsorted(ring_tokens, tokens, side="left") % len(ring)
+    # spread uuids evenly among the close ranks
+    n = num_cands[pos]
+    choice = keys[:, 1] % np.maximum(n, 1).astype(np.uint64)
+    affinity = table[pos, choice.astype(np.int64)]
+    affinity[n == 0] = -1
+    return affinity
@@ -12,10 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import random
 import math
 import numpy as np
 
+from crs4.cassandra_utils._permutation import permute_index
+
 
 def uuid2ints(uuid):
     # convert to CassUuid format
@@ -24,12 +25,48 @@ def uuid2ints(uuid):
     return (i1, i2)
 
 
+def uuids_to_keys(uuids):
+    # convert uuids to a (N, 2) array of uint64, unless already converted
+    if isinstance(uuids, np.ndarray) and uuids.dtype == np.uint64:
+        return uuids.reshape(-1, 2)
+    return bytes_to_keys(b"".join(u.bytes for u in uuids))
+
+
+def keys_to_bytes(keys):
+    # convert (N, 2) uint64 keys back to (N, 16) uuid bytes (big-endian)
+    keys = uuids_to_keys(keys)
+    i1, i2 = keys[:, 0], keys[:, 1]
+    hi = (i1 << np.uint64(32)) | ((i1 >> np.uint64(16)) & np.uint64(0xFFFF0000))
+    hi |= i1 >> np.uint64(48)
+    out = np.empty((len(keys), 2), dtype=">u8")
+    out[:, 0] = hi
+    out[:, 1] = i2
+    return out.view(np.uint8).reshape(-1, 16)
+
+
+def bytes_to_keys(buf):
+    # convert (N, 16) uuid bytes (big-endian, as in uuid.UUID.bytes) to
+    # (N, 2) uint64 keys, the inverse of keys_to_bytes
+    be = np.frombuffer(buf, dtype=">u8").reshape(-1, 2)
+    hi = be[:, 0].astype(np.uint64)
+    keys = np.empty((len(be), 2), dtype=np.uint64)
+    keys[:, 0] = (
+        (hi >> np.uint64(32))
+        | (((hi >> np.uint64(16)) & np.uint64(0xFFFF)) << np.uint64(32))
+        | (hi << np.uint64(48))
+    )
+    keys[:, 1] = be[:, 1]
+    return keys
+
+
 def uuids_as_tensors(uuids, bs):
-    uuids = list(map(uuid2ints, uuids))  # convert uuids to ints
-    uuids = np.array(uuids, dtype=np.uint64)
-    uuids = np.pad(uuids, ((0, bs - len(uuids) % bs), (0, 0)), "edge")
-    uuids = uuids.reshape([-1, bs, 2])
-    return uuids
+    uuids = uuids_to_keys(uuids)  # convert uuids to ints
+    # note: a full batch of padding is added when len(uuids) % bs == 0
+    pad = bs - len(uuids) % bs
+    out = np.empty((len(uuids) + pad, 2), dtype=np.uint64)
+    out[: len(uuids)] = uuids
+    out[len(uuids) :] = uuids[-1]
+    return out.reshape([-1, bs, 2])
 
 
 def get_shard(
@@ -39,9 +76,20 @@ def get_shard(
     shard_id=0,
     num_shards=1,
     seed=0,
+    affinity=None,
+    lazy_shuffle=False,
 ):
-    random.seed(seed + epoch)
-    random.shuffle(uuids)
+    if lazy_shuffle:
+        return get_lazy_shard(
+            uuids, batch_size, seed + epoch, shard_id, num_shards
+        )
+    rng = np.random.default_rng(seed + epoch)
+    if affinity is not None:
+        return get_replica_shard(
+            uuids, affinity, batch_size, shard_id, num_shards, rng
+        )
+    # convert once, then shuffle the (N, 2) array of keys
+    uuids = uuids_to_keys(uuids)[rng.permutation(len(uuids))]
     real_sz = len(uuids)
     uuids = uuids_as_tensors(uuids, batch_size)
     pad_sz = uuids.size / 2  # padded size
@@ -56,3 +104,61 @@ def get_shard(
         shard_sz -= del_sz
 
     return shard_uuids, shard_sz
+
+
+def get_lazy_shard(uuids, batch_size, seed, shard_id=0, num_shards=1):
+    # same layout as get_shard, but only the uuids of this shard are
+    # permuted (via permute_index) and converted
+    real_sz = len(uuids)
+    num_batches = real_sz // batch_size + 1  # as in uuids_as_tensors
+    shard_size = math.ceil(num_batches / num_shards)
+    shard_begin = math.floor(shard_id * num_batches / num_shards)
+    shard_end = min(shard_begin + shard_size, num_batches)
+    pos = np.arange(shard_begin * batch_size, shard_end * batch_size)
+    # padding repeats the last element of the permuted dataset
+    idx = permute_index(np.minimum(pos, real_sz - 1), real_sz, seed)
+    if isinstance(uuids, np.ndarray):
+        shard_keys = uuids_to_keys(uuids[idx])
+    else:
+        shard_keys = uuids_to_keys([uuids[i] for i in idx])
+    shard_uuids = shard_keys.reshape([-1, batch_size, 2])
+    shard_sz = shard_uuids.size / 2
+    if shard_id == num_shards - 1:
+        shard_sz -= num_batches * batch_size - real_sz
+    return shard_uuids, shard_sz
+
+
+def get_replica_shard(
+    uuids, affinity, batch_size, shard_id=0, num_shards=1, rng=None
+):
+    # shuffle uuids and affinity together
+    if rng is None:
+        rng = np.random.default_rng()
+    idx = rng.permutation(len(uuids))
+    keys = uuids_to_keys(uuids)[idx]
+    aff = np.asarray(affinity, dtype=np.int64)[idx]
+    real_sz = len(keys)
+    shard_size = math.ceil(real_sz / num_shards)
+    # each shard takes up to shard_size uuids among those close to it
+    aff = np.where((aff >= 0) & (aff < num_shards), aff, num_shards)
+    order = np.argsort(aff, kind="stable")
+    counts = np.bincount(aff, minlength=num_shards + 1)
+    starts = np.cumsum(counts) - counts
+    pos = np.empty(real_sz, dtype=np.int64)
+    pos[order] = np.arange(real_sz) - starts[aff[order]]
+    taken = (aff < num_shards) & (pos < shard_size)
+    # the remaining ones form a pool, used to even out the shard sizes
+    deficit = shard_size - np.minimum(counts[:num_shards], shard_size)
+    pool = np.flatnonzero(~taken)
+    mine = taken & (aff == shard_id)
+    if len(pool) > 0:
+        pool_pos = np.arange(len(pool)) - deficit[:shard_id].sum()
+        mine[pool[pool_pos % len(pool) < deficit[shard_id]]] = True
+    shard_keys = keys[mine]
+    if len(shard_keys) == 0:
+        shard_keys = keys[:1]
+    # pad shard to shard_size and then to a multiple of batch_size
+    pad_sz = math.ceil(shard_size / batch_size) * batch_size
+    shard_keys = np.pad(shard_keys, ((0, pad_sz - len(shard_keys)), (0, 0)), "edge")
+    shard_uuids = shard_keys.reshape([-1, batch_size, 2])
+    return shard_uuids, shard_size
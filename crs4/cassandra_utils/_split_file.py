@@ -0,0 +1,73 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+
+from crs4.cassandra_utils._uuid_file import (
+    is_uuids_file,
+    load_uuids_file,
+    save_uuids_file,
+)
+
+
+def save_split_file(filename, split_metadata):
+    """Save a split file in binary format
+
+    The file is a binary uuid file (see save_uuids_file) with the
+    splits, which can be passed directly to the reader as
+    ``split_file``, together with ``split_index``.
+
+    :param filename: Local filename, as string
+    :param split_metadata: Dictionary with "row_keys" (uuids or
+                           (N, 2) uint64 keys), "split" (list of
+                           arrays of indexes of row_keys) and other
+                           JSON-serializable entries (e.g., data_table)
+    :returns:
+    :rtype:
+
+    """
+    info = {
+        k: (v.item() if hasattr(v, "item") else v)
+        for k, v in split_metadata.items()
+        if k not in ("row_keys", "split")
+    }
+    save_uuids_file(
+        filename,
+        split_metadata["row_keys"],
+        splits=split_metadata["split"],
+        meta={"split_file": info},
+    )
+
+
+def load_split_file(filename):
+    """Load a split file, either binary or pickled
+
+    :param filename: Local filename, as string
+    :returns: Dictionary with "row_keys" (memory-mapped (N, 2) uint64
+              array, or array of uuids for pickled files), "split" and
+              the other entries saved with the file
+    :rtype: dict
+
+    """
+    if not is_uuids_file(filename):
+        # legacy pickled split file
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    uf = load_uuids_file(filename)
+    if uf["splits"] is None:
+        raise ValueError(f"{filename} has no splits")
+    data = dict(uf["meta"].get("split_file", {}))
+    data["row_keys"] = uf["keys"]
+    data["split"] = uf["splits"]
+    return data
@@ -13,11 +13,71 @@
 # limitations under the License.
 
 from crs4.cassandra_utils._cassandra_session import CassandraSession
+from crs4.cassandra_utils._token_scan import scan_columns
+from crs4.cassandra_utils._split_file import save_split_file
 import pandas as pd
 import numpy as np
 import pickle
 
 
+def _sort_by_class(labels, rng):
+    # indexes sorted by class, randomly permuted within each class
+    labels = np.asarray(labels)
+    order = np.lexsort((rng.random(len(labels)), labels))
+    classes, starts, counts = np.unique(
+        labels[order], return_index=True, return_counts=True
+    )
+    cls = np.repeat(np.arange(len(classes)), counts)
+    rank = np.arange(len(labels)) - starts[cls]  # position within class
+    return order, cls, rank, counts
+
+
+def stratified_split(labels, split_ratio_list, samples_per_class=None, seed=None):
+    """Split a dataset, keeping the class proportions in each split
+
+    :param labels: Label of each row
+    :param split_ratio_list: Weight of each split (e.g., [7, 2, 1])
+    :param samples_per_class: Number of rows to be used for each class,
+                              in sorted class order (default: all)
+    :param seed: Seed of the random selection
+    :returns: One array of row indexes for each split
+    :rtype: list of numpy arrays
+
+    """
+    rng = np.random.default_rng(seed)
+    order, cls, rank, counts = _sort_by_class(labels, rng)
+    if samples_per_class is None:
+        samples_per_class = counts
+    tot = np.asarray(samples_per_class, dtype=np.int64)
+    ratios = np.asarray(split_ratio_list, dtype=np.float64)
+    # cut points of each class, a single leftover row goes to the last split
+    cuts = np.cumsum(
+        np.trunc(tot[:, None] * ratios[None, :] / ratios.sum()).astype(np.int64),
+        axis=1,
+    )
+    cuts[:, -1] = np.where(tot - cuts[:, -1] == 1, tot, cuts[:, -1])
+    # split of each row (len(ratios) if unused)
+    split_id = (rank[:, None] >= cuts[cls]).sum(axis=1)
+    return [order[split_id == k] for k in range(len(ratios))]
+
+
+def kfold_split(labels, num_folds, seed=None):
+    """Stratified k-fold partition of a dataset
+
+    :param labels: Label of each row
+    :param num_folds: Number of folds
+    :param seed: Seed of the random assignment
+    :returns: One array of row indexes for each fold
+    :rtype: list of numpy arrays
+
+    """
+    rng = np.random.default_rng(seed)
+    order, _, _, _ = _sort_by_class(labels, rng)
+    # deal rows round-robin, so that each class is spread evenly
+    fold_id = np.arange(len(order)) % num_folds
+    return [order[fold_id == k] for k in range(num_folds)]
+
+
 class split_generator:
     def __init__(self, data_id_col=None, metadata_id_col=None, data_col=None, data_label_col=None, metadata_label_col=None, label_type=None):
         ## Preliminary check on arguments
@@ -43,11 +103,11 @@ class split_generator:
         self._data_table = None
         self._metadata_table = None
 
-    def load_from_db(self, cass_conf, data_table, metadata_table):
+    def load_from_db(self, cass_conf, data_table, metadata_table, cols=None):
         self._data_table = data_table
         self._metadata_table = metadata_table
         self.cass_conf = cass_conf
-        self._df = self.get_df_from_metadata()
+        self._df = self.get_df_from_metadata(cols)
         self.setup()
 
     def load_from_file(self, fn):
@@ -94,19 +154,70 @@ class split_generator:
             # This is just a placeholder initialization
         }
 
-    def get_df_from_metadata(self):
+    def get_df_from_metadata(self, cols=None, concurrency=16):
+        """Read the metadata table into a DataFrame
+
+        Token ranges are scanned in parallel and each column is
+        built as a typed numpy array.
+
+        :param cols: Columns to be read (default: id and label columns)
+        :param concurrency: Number of token ranges scanned concurrently
+        :returns: Metadata, one row per item
+        :rtype: pandas.DataFrame
+
+        """
         cs = CassandraSession(self.cass_conf)
         sess = cs.sess
 
+        if cols is None:
+            cols = [self._metadata_id_col]
+            if self._label_type != "none":
+                cols.append(self._metadata_label_col)
         ## Get rows
-        query = f"SELECT * FROM {self._metadata_table};"
-        rows = sess.execute(query, execution_profile="dict", timeout=120)
-        df = pd.DataFrame(rows)
+        data = scan_columns(
+            sess, self._metadata_table, cols, concurrency=concurrency
+        )
+        df = pd.DataFrame(data, copy=False)
 
         return df
 
-    def save_splits(self, out_split_fn="cassandra_split_file.pckl"):
-        pickle.dump(self.split_metadata, open(out_split_fn, "wb"))
+    def save_splits(self, out_split_fn="cassandra_split_file.split"):
+        save_split_file(out_split_fn, self.split_metadata)
+
+    def _set_split(self, split, labels):
+        self.split_metadata["row_keys"] = self._df[self._metadata_id_col].to_numpy()
+        self.split_metadata["split"] = split
+        self.split_metadata["num_classes"] = len(np.unique(labels))
+
+    def create_stratified_split(
+        self, split_ratio_list, samples_per_class=None, seed=None
+    ):
+        """Populate split_metadata with splits keeping class proportions
+
+        :param split_ratio_list: Weight of each split (e.g., [7, 2, 1])
+        :param samples_per_class: Number of rows for each class (default: all)
+        :param seed: Seed of the random selection
+
+        """
+        labels = self._df[self._metadata_label_col].to_numpy()
+        self._set_split(
+            stratified_split(labels, split_ratio_list, samples_per_class, seed),
+            labels,
+        )
+
+    def create_kfold_split(self, num_folds, seed=None):
+        """Populate split_metadata with stratified folds
+
+        Fold ``i`` can be used for validation and the other ones for
+        training.
+
+        :param num_folds: Number of folds
+        :param seed: Seed of the random assignment
+
+        """
+        labels = self._df[self._metadata_label_col].to_numpy()
+        self._set_split(kfold_split(labels, num_folds, seed), labels)
+        self.split_metadata["num_folds"] = num_folds
 
     def create_splits(self, **kwargs):
         """
@@ -0,0 +1,101 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+# binary layout, see also crs4/cpp/payload_decoder.h
+TENSOR_MAGIC = b"CT"
+TENSOR_LZ4 = 1
+_header_t = np.dtype(
+    [("magic", "S2"), ("dtype", "u1"), ("ndim", "u1"), ("flags", "<u4")]
+)
+# numpy dtypes and corresponding DALIDataType codes
+_dali_types = {
+    np.dtype("uint8"): 0,
+    np.dtype("uint16"): 1,
+    np.dtype("uint32"): 2,
+    np.dtype("uint64"): 3,
+    np.dtype("int8"): 4,
+    np.dtype("int16"): 5,
+    np.dtype("int32"): 6,
+    np.dtype("int64"): 7,
+    np.dtype("float16"): 8,
+    np.dtype("float32"): 9,
+    np.dtype("float64"): 10,
+    np.dtype("bool"): 11,
+}
+_np_types = {v: k for k, v in _dali_types.items()}
+
+
+def _lz4_block():
+    try:
+        import lz4.block
+    except ImportError:
+        raise ImportError("Please install lz4 to use compressed tensors")
+    return lz4.block
+
+
+def encode_tensor(arr, compress=False):
+    """Encode a tensor as a blob with a compact dtype+shape header
+
+    The blob can be returned by the reader as a typed tensor, by
+    setting ``data_decoding="tensor"`` (or ``label_decoding``). For
+    instance, images can be stored pre-decoded, as HWC uint8 arrays.
+
+    :param arr: numpy array
+    :param compress: Compress data with lz4 (requires the lz4 package)
+    :returns: Encoded tensor
+    :rtype: bytes
+
+    """
+    arr = np.asarray(arr)
+    dtype = arr.dtype.newbyteorder("=")
+    if dtype not in _dali_types:
+        raise ValueError(f"Unsupported dtype: {arr.dtype}")
+    if arr.ndim > 255:
+        raise ValueError("Too many dimensions")
+    flags = TENSOR_LZ4 if compress else 0
+    header = np.array(
+        [(TENSOR_MAGIC, _dali_types[dtype], arr.ndim, flags)], dtype=_header_t
+    )
+    shape = np.asarray(arr.shape, dtype="<u4")
+    data = np.ascontiguousarray(arr, dtype=dtype.newbyteorder("<")).tobytes()
+    if compress:
+        data = _lz4_block().compress(data, store_size=False)
+    return header.tobytes() + shape.tobytes() + data
+
+
+def decode_tensor(buf):
+    """Decode a blob written by encode_tensor
+
+    :param buf: Encoded tensor, as bytes
+    :returns: Decoded tensor
+    :rtype: numpy array
+
+    """
+    header = np.frombuffer(buf, dtype=_header_t, count=1)
+    if header["magic"][0] != TENSOR_MAGIC:
+        raise ValueError("Not a tensor payload")
+    flags = int(header["flags"][0])
+    if flags & ~TENSOR_LZ4:
+        raise ValueError("Unsupported tensor payload flags")
+    ndim = int(header["ndim"][0])
+    shape = np.frombuffer(buf, dtype="<u4", count=ndim, offset=_header_t.itemsize)
+    dtype = _np_types[int(header["dtype"][0])].newbyteorder("<")
+    off = _header_t.itemsize + 4 * ndim
+    data = memoryview(buf)[off:]
+    if flags & TENSOR_LZ4:
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        data = _lz4_block().decompress(data, uncompressed_size=nbytes)
+    return np.frombuffer(data, dtype=dtype).reshape(shape)
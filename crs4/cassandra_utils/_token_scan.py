@@ -0,0 +1,214 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import threading
+
+from crs4.cassandra_utils._sharding import bytes_to_keys
+
+# Murmur3Partitioner tokens
+MIN_TOKEN = -(2**63)
+MAX_TOKEN = 2**63 - 1
+
+# numpy dtypes of numeric CQL types, everything else is stored as object
+_cql_dtypes = {
+    "boolean": np.bool_,
+    "tinyint": np.int8,
+    "smallint": np.int16,
+    "int": np.int32,
+    "bigint": np.int64,
+    "counter": np.int64,
+    "float": np.float32,
+    "double": np.float64,
+}
+
+
+def token_ranges(num_ranges):
+    """Split the token ring in contiguous (lo, hi] ranges
+
+    :param num_ranges: Number of ranges
+    :returns: List of (lo, hi) pairs
+    :rtype: list
+
+    """
+    bounds = [
+        MIN_TOKEN + (MAX_TOKEN - MIN_TOKEN) * i // num_ranges
+        for i in range(num_ranges + 1)
+    ]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def scan_table(
+    sess,
+    table,
+    cols,
+    partition_key,
+    convert,
+    num_ranges=None,
+    concurrency=16,
+    fetch_size=10000,
+    progress=True,
+):
+    """Read columns of a whole table, scanning token ranges in parallel
+
+    :param sess: Cassandra session
+    :param table: Table, in the format keyspace.tablename
+    :param cols: Columns to be read
+    :param partition_key: Partition key column(s) of the table
+    :param convert: Function mapping a page of row tuples to a tuple
+                    of numpy arrays, one per output column
+    :param num_ranges: Number of token ranges (default: 4 * concurrency)
+    :param concurrency: Number of ranges scanned concurrently
+    :param fetch_size: Page size
+    :param progress: Show a progress bar (requires tqdm)
+    :returns: Output columns, in token order
+    :rtype: tuple of numpy arrays
+
+    """
+    if num_ranges is None:
+        num_ranges = 4 * concurrency
+    if not isinstance(partition_key, str):
+        partition_key = ", ".join(partition_key)
+    query = (
+        f"SELECT {', '.join(cols)} FROM {table} "
+        f"WHERE token({partition_key}) > ? AND token({partition_key}) <= ?"
+    )
+    prep = sess.prepare(query)
+    prep.fetch_size = fetch_size
+    if progress:
+        from tqdm import tqdm
+
+        pbar = tqdm(unit="rows")
+        pbar_lock = threading.Lock()
+
+    def scan(rng):
+        # converted pages of the range
+        pages = []
+        res = sess.execute(prep, rng, execution_profile="tuple", timeout=120)
+        while True:
+            rows = res.current_rows
+            if rows:
+                pages.append(convert(rows))
+                if progress:
+                    with pbar_lock:
+                        pbar.update(len(rows))
+            if not res.has_more_pages:
+                break
+            res.fetch_next_page()
+        return pages
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        pages = [p for r in ex.map(scan, token_ranges(num_ranges)) for p in r]
+    if progress:
+        pbar.close()
+    if not pages:
+        return convert([])
+    # copy the pages into preallocated columns, pages with null values
+    # (stored as object) turn the whole column to object
+    total = sum(len(p[0]) for p in pages)
+    out = tuple(
+        np.empty(
+            (total, *c.shape[1:]),
+            dtype=np.result_type(*(p[i].dtype for p in pages)),
+        )
+        for i, c in enumerate(pages[0])
+    )
+    pos = 0
+    for p in pages:
+        n = len(p[0])
+        for o, c in zip(out, p):
+            o[pos : pos + n] = c
+        pos += n
+    return out
+
+
+def scan_keys(sess, table, id_col, cols=(), dtypes=(), **kwargs):
+    """Read all the uuids of a table, and optionally other columns
+
+    :param sess: Cassandra session
+    :param table: Table, in the format keyspace.tablename
+    :param id_col: uuid column, which must be the partition key
+    :param cols: Other columns to be read
+    :param dtypes: numpy dtypes of the other columns
+    :param kwargs: Further arguments for scan_table (e.g., concurrency)
+    :returns: (N, 2) uint64 array of keys, followed by the other columns
+    :rtype: tuple of numpy arrays
+
+    """
+
+    def convert(rows):
+        keys = bytes_to_keys(b"".join(r[0].bytes for r in rows))
+        others = tuple(
+            np.array([r[i + 1] for r in rows], dtype=dt)
+            for i, dt in enumerate(dtypes)
+        )
+        return (keys, *others)
+
+    return scan_table(sess, table, [id_col, *cols], id_col, convert, **kwargs)
+
+
+def table_schema(sess, table, cols=None):
+    """Get partition key and numpy dtypes of the columns of a table
+
+    :param sess: Cassandra session
+    :param table: Table, in the format keyspace.tablename
+    :param cols: Columns of interest (default: all)
+    :returns: Partition key columns and dictionary of dtypes
+    :rtype: tuple
+
+    """
+    keyspace, name = table.split(".")
+    meta = sess.cluster.metadata.keyspaces[keyspace].tables[name]
+    if cols is None:
+        cols = list(meta.columns)
+    dtypes = {c: _cql_dtypes.get(meta.columns[c].cql_type, object) for c in cols}
+    pkey = [c.name for c in meta.partition_key]
+    return pkey, dtypes
+
+
+def _to_array(vals, dtype):
+    if dtype is not object:
+        try:
+            return np.array(vals, dtype=dtype)
+        except TypeError:
+            pass  # null values
+    # fromiter keeps a 1D array even for collection values
+    return np.fromiter(vals, dtype=object, count=len(vals))
+
+
+def scan_columns(sess, table, cols=None, **kwargs):
+    """Read columns of a whole table into typed numpy arrays
+
+    Numeric columns get the matching numpy dtype (object, if they
+    contain null values), other columns are stored as object arrays.
+
+    :param sess: Cassandra session
+    :param table: Table, in the format keyspace.tablename
+    :param cols: Columns to be read (default: all)
+    :param kwargs: Further arguments for scan_table (e.g., concurrency)
+    :returns: Dictionary of columns, e.g., to build a pandas DataFrame
+    :rtype: dict
+
+    """
+    pkey, dtypes = table_schema(sess, table, cols)
+    cols = list(dtypes)
+
+    def convert(rows):
+        return tuple(
+            _to_array([r[i] for r in rows], dtypes[c]) for i, c in enumerate(cols)
+        )
+
+    res = scan_table(sess, table, cols, pkey, convert, **kwargs)
+    return dict(zip(cols, res))
@@ -0,0 +1,170 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import numpy as np
+
+from crs4.cassandra_utils._sharding import uuids_to_keys
+
+# binary layout, see also crs4/cpp/uuid_file.h
+UUID_FILE_MAGIC = b"CRS4UUID"
+UUID_FILE_VERSION = 1
+UUID_FILE_SIZES = 1
+UUID_FILE_LABELS = 2
+UUID_FILE_AFFINITY = 4
+UUID_FILE_CHECKSUMS = 8
+UUID_FILE_SPLITS = 16
+_header_t = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("flags", "<u4"),
+        ("count", "<u8"),
+        ("meta_len", "<u8"),
+    ]
+)
+
+
+def _pad8(n):
+    return -n % 8
+
+
+def save_uuids_file(
+    filename,
+    uuids,
+    labels=None,
+    sizes=None,
+    affinity=None,
+    meta=None,
+    checksums=None,
+    splits=None,
+):
+    """Save uuids to a compact binary file
+
+    The file can be passed to the reader via its ``uuids_file``
+    argument, instead of a list of strings via ``source_uuids``.
+
+    :param filename: Local filename, as string
+    :param uuids: List of uuid.UUID, or (N, 2) uint64 array of keys
+    :param labels: Optional list of int labels, one per uuid
+    :param sizes: Optional list of sizes in bytes, one per uuid
+    :param affinity: Optional list of preferred shards, one per uuid
+                     (see get_replica_affinity)
+    :param meta: Optional dictionary, saved as JSON in the header
+    :param checksums: Optional list of crc32 checksums, one per uuid
+    :param splits: Optional list of splits, each one an array of
+                   indexes of uuids (see split_file in the reader)
+    :returns:
+    :rtype:
+
+    """
+    keys = np.ascontiguousarray(uuids_to_keys(uuids), dtype="<u8")
+    count = keys.shape[0]
+    flags = 0
+    columns = [keys]
+    if sizes is not None:
+        flags |= UUID_FILE_SIZES
+        columns.append(np.asarray(sizes, dtype="<u8"))
+    if labels is not None:
+        flags |= UUID_FILE_LABELS
+        columns.append(np.asarray(labels, dtype="<i4"))
+    if affinity is not None:
+        flags |= UUID_FILE_AFFINITY
+        columns.append(np.asarray(affinity, dtype="<i4"))
+    if checksums is not None:
+        flags |= UUID_FILE_CHECKSUMS
+        # as stored by the writers, i.e., signed 32 bit
+        columns.append(np.asarray(checksums, dtype=np.int64).astype("<i4"))
+    for col in columns[1:]:
+        if col.shape != (count,):
+            raise ValueError("Optional columns must have one entry per uuid")
+    if splits is not None:
+        flags |= UUID_FILE_SPLITS
+        splits = [np.asarray(sp, dtype="<u8").reshape(-1) for sp in splits]
+        for sp in splits:
+            if len(sp) > 0 and sp.max() >= count:
+                raise ValueError("Split indexes must refer to existing uuids")
+        # aligned to 8 bytes: number of splits, their lengths, the indexes
+        lens = [len(split) for split in splits]
+        cols_len = sum(col.nbytes for col in columns)
+        columns.append(np.zeros(_pad8(cols_len), dtype=np.uint8))
+        columns.append(np.array([len(splits), *lens], dtype="<u8"))
+        columns.extend(splits)
+    meta = json.dumps(meta or {}).encode()
+    header = np.array(
+        [(UUID_FILE_MAGIC, UUID_FILE_VERSION, flags, count, len(meta))],
+        dtype=_header_t,
+    )
+    with open(filename, "wb") as f:
+        f.write(header.tobytes())
+        f.write(meta + b"\0" * _pad8(len(meta)))
+        for col in columns:
+            f.write(col.tobytes())
+
+
+def is_uuids_file(filename):
+    """Check whether a file is a binary uuid file (or a legacy pickle)"""
+    with open(filename, "rb") as f:
+        return f.read(len(UUID_FILE_MAGIC)) == UUID_FILE_MAGIC
+
+
+def load_uuids_file(filename):
+    """Memory-map a binary uuid file
+
+    :param filename: Local filename, as string
+    :returns: Dictionary with "keys" ((N, 2) uint64 array), "sizes",
+              "labels", "affinity", "checksums", "splits" (None if
+              not available) and "meta"
+    :rtype: dict
+
+    """
+    header = np.fromfile(filename, dtype=_header_t, count=1)
+    if len(header) != 1 or header["magic"][0] != UUID_FILE_MAGIC:
+        raise ValueError(f"{filename} is not a uuid file")
+    version = int(header["version"][0])
+    if version != UUID_FILE_VERSION:
+        raise ValueError(f"Unsupported uuid file version: {version}")
+    flags = int(header["flags"][0])
+    count = int(header["count"][0])
+    meta_len = int(header["meta_len"][0])
+    with open(filename, "rb") as f:
+        f.seek(_header_t.itemsize)
+        meta = json.loads(f.read(meta_len) or b"{}")
+    off = _header_t.itemsize + meta_len + _pad8(meta_len)
+
+    def column(dtype, shape):
+        nonlocal off
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        col = np.memmap(filename, dtype=dtype, mode="r", offset=off, shape=shape)
+        off += col.nbytes
+        return col
+
+    stuff = {"keys": column("<u8", (count, 2))}
+    stuff["sizes"] = column("<u8", (count,)) if flags & UUID_FILE_SIZES else None
+    stuff["labels"] = column("<i4", (count,)) if flags & UUID_FILE_LABELS else None
+    stuff["affinity"] = (
+        column("<i4", (count,)) if flags & UUID_FILE_AFFINITY else None
+    )
+    stuff["checksums"] = (
+        column("<i4", (count,)) if flags & UUID_FILE_CHECKSUMS else None
+    )
+    stuff["splits"] = None
+    if flags & UUID_FILE_SPLITS:
+        off += _pad8(off)
+        num_splits = int(column("<u8", (1,))[0])
+        lens = column("<u8", (num_splits,))
+        stuff["splits"] = [column("<u8", (int(n),)) for n in lens]
+    stuff["meta"] = meta
+    return stuff
@@ -26,6 +26,15 @@ BatchLoader::~BatchLoader() {
     ignore_batch();
     cass_session_free(session);
     cass_cluster_free(cluster);
+    // free rows arrived after the last batch was closed
+    while (!ooo_stash.empty()) {
+      cass_result_free(ooo_stash.front());
+      ooo_stash.pop();
+    }
+    if (partial_batches > 0) {
+      std::cerr << "ooo_deadline expired for " << partial_batches
+                << " batches, " << late_rows << " late rows" << std::endl;
+    }
     delete(copy_pool);
     delete(comm_pool);
     delete(wait_pool);
@@ -226,7 +235,9 @@ BatchLoader::BatchLoader(std::string table, std::string label_type,
                          std::string ssl_certificate, std::string ssl_own_certificate,
                          std::string ssl_own_key, std::string ssl_own_key_pass,
                          size_t io_threads, size_t prefetch_buffers, size_t copy_threads,
-                         size_t wait_threads, size_t comm_threads, bool ooo) :
+                         size_t wait_threads, size_t comm_threads, bool ooo,
+                         int ooo_deadline, std::string data_decoding,
+                         std::string label_decoding, int decode_min_size) :
   table(table), label_col(label_col), data_col(data_col), id_col(id_col),
   username(username), password(password), cassandra_ips(cassandra_ips),
   cloud_config(cloud_config), port(port), use_ssl(use_ssl),
@@ -234,13 +245,17 @@ BatchLoader::BatchLoader(std::string table, std::string label_type,
   ssl_own_key(ssl_own_key), ssl_own_key_pass(ssl_own_key_pass),
   io_threads(io_threads), copy_threads(copy_threads),
   wait_threads(wait_threads), comm_threads(comm_threads),
-  prefetch_buffers(prefetch_buffers), ooo(ooo) {
+  prefetch_buffers(prefetch_buffers), ooo(ooo), ooo_deadline(ooo_deadline) {
+  // payloads of blob columns
+  data_payload = get_payload_type(data_decoding);
+  label_payload = get_payload_type(label_decoding);
+  this->decode_min_size = decode_min_size;
   // setting label type, default is lab_none
   if (label_type == "int") {
     label_t = lab_int;
   } else if (label_type == "blob") {
     label_t = lab_img;
-    lab_shapes.resize(prefetch_buffers);
+    lab_hdrs.resize(prefetch_buffers);
   }
   // init multi-buffering variables
   bs.resize(prefetch_buffers);
@@ -250,7 +265,9 @@ BatchLoader::BatchLoader(std::string table, std::string label_type,
   comm_job.resize(prefetch_buffers);
   v_feats.resize(prefetch_buffers);
   v_labs.resize(prefetch_buffers);
-  shapes.resize(prefetch_buffers);
+  hdrs.resize(prefetch_buffers);
+  img_bufs.resize(prefetch_buffers);
+  preallocated.resize(prefetch_buffers, false);
   alloc_cv = std::vector<std::condition_variable>(prefetch_buffers);
   alloc_mtx = std::vector<std::mutex>(prefetch_buffers);
   for (size_t i = 0; i < prefetch_buffers; ++i) {
@@ -265,18 +282,33 @@ BatchLoader::BatchLoader(std::string table, std::string label_type,
   });
 }
 
-void BatchLoader::allocTens(int wb) {
-  shapes[wb].clear();
-  shapes[wb].resize(bs[wb]);
+void BatchLoader::allocTens(int wb, const std::vector<uint64_t>& hints) {
+  hdrs[wb].clear();
+  hdrs[wb].resize(bs[wb]);
+  img_bufs[wb].clear();
+  img_bufs[wb].resize(bs[wb]);
   v_feats[wb] = BatchRawImage();
   v_feats[wb].set_pinned(false);
+  // raw data sizes known in advance: allocate features right away
+  preallocated[wb] = !hints.empty() && data_payload == payload_raw && !ooo;
+  if (preallocated[wb]) {
+    if (hints.size() != bs[wb]) {
+      throw std::runtime_error("Error: number of size hints and keys differ");
+    }
+    dali::TensorListShape<> t_sz(bs[wb], 1);
+    for (size_t i = 0; i != bs[wb]; ++i) {
+      parse_payload(payload_raw, nullptr, hints[i], hdrs[wb][i]);
+      t_sz.set_tensor_shape(i, hdrs[wb][i].shape);
+    }
+    v_feats[wb].Resize(t_sz, dali::DALIDataType::DALI_UINT8);
+  }
   // v_feats[wb].SetContiguity(::dali::BatchContiguity::Contiguous);
   v_labs[wb] = BatchLabel();
   v_labs[wb].set_pinned(false);
   // v_labs[wb].SetContiguity(::dali::BatchContiguity::Contiguous);
   if (label_t == lab_img) {
-    lab_shapes[wb].clear();
-    lab_shapes[wb].resize(bs[wb]);
+    lab_hdrs[wb].clear();
+    lab_hdrs[wb].resize(bs[wb]);
   } else {
     // if labels are not images we can already allocate the memory
     std::vector<int64_t> v_sz(bs[wb], 1);
@@ -285,56 +317,93 @@ void BatchLoader::allocTens(int wb) {
   }
 }
 
-void BatchLoader::copy_data_none(const CassResult* result,
-                                 const cass_byte_t* data, size_t sz,
+void BatchLoader::copy_data_none(ResultPtr result,
+                                 const cass_byte_t* data,
                                  int off, int wb) {
+  if (data_payload == payload_image) {
+    // decode while the rest of the batch is still in flight
+    decode_image(hdrs[wb][off], data, img_bufs[wb][off].get());
+  }
   // wait for feature tensor to be allocated
-  {
+  if (!preallocated[wb]) {
     std::unique_lock<std::mutex> lck(alloc_mtx[wb]);
     alloc_cv[wb].wait(lck, [&]{ return copy_jobs[wb].size() == bs[wb]; });
   }
   // copy data in batch
-  std::memcpy(v_feats[wb].raw_mutable_tensor(off), data, sz);
+  if (data_payload != payload_image) {
+    copy_payload(hdrs[wb][off], data, v_feats[wb][off]);
+  }
 
-  // free Cassandra result memory (data included)
-  cass_result_free(result);
+  // release Cassandra result (data included), freed after its last slot
+  result.reset();
 }
 
-void BatchLoader::copy_data_int(const CassResult* result,
-                              const cass_byte_t* data, size_t sz,
+void BatchLoader::copy_data_int(ResultPtr result,
+                              const cass_byte_t* data,
                               cass_int32_t lab, int off, int wb) {
+  if (data_payload == payload_image) {
+    // decode while the rest of the batch is still in flight
+    decode_image(hdrs[wb][off], data, img_bufs[wb][off].get());
+  }
   // wait for feature tensor to be allocated
-  {
+  if (!preallocated[wb]) {
     std::unique_lock<std::mutex> lck(alloc_mtx[wb]);
     alloc_cv[wb].wait(lck, [&]{ return copy_jobs[wb].size() == bs[wb]; });
   }
   // copy data in batch
-  std::memcpy(v_feats[wb].raw_mutable_tensor(off), data, sz);
+  if (data_payload != payload_image) {
+    copy_payload(hdrs[wb][off], data, v_feats[wb][off]);
+  }
   std::memcpy(v_labs[wb].raw_mutable_tensor(off), &lab, sizeof(INT_LABEL_T));
 
-  // free Cassandra result memory (data included)
-  cass_result_free(result);
+  // release Cassandra result (data included), freed after its last slot
+  result.reset();
 }
 
-void BatchLoader::copy_data_img(const CassResult* result,
-                                const cass_byte_t* data, size_t sz,
-                                const cass_byte_t* lab, size_t l_sz,
+void BatchLoader::copy_data_img(ResultPtr result,
+                                const cass_byte_t* data,
+                                const cass_byte_t* lab,
                                 int off, int wb) {
+  if (data_payload == payload_image) {
+    // decode while the rest of the batch is still in flight
+    decode_image(hdrs[wb][off], data, img_bufs[wb][off].get());
+  }
+  if (preallocated[wb]) {
+    // feature tensor already allocated
+    copy_payload(hdrs[wb][off], data, v_feats[wb][off]);
+  }
   // wait for feature and target tensors to be allocated
   {
     std::unique_lock<std::mutex> lck(alloc_mtx[wb]);
     alloc_cv[wb].wait(lck, [&]{ return copy_jobs[wb].size() == bs[wb]; });
   }
   // copy data in batch
-  std::memcpy(v_feats[wb].raw_mutable_tensor(off), data, sz);
-  std::memcpy(v_labs[wb].raw_mutable_tensor(off), lab, l_sz);
+  if (data_payload != payload_image && !preallocated[wb]) {
+    copy_payload(hdrs[wb][off], data, v_feats[wb][off]);
+  }
+  copy_payload(lab_hdrs[wb][off], lab, v_labs[wb][off]);
 
-  // free Cassandra result memory (data included)
-  cass_result_free(result);
+  // release Cassandra result (data included), freed after its last slot
+  result.reset();
 }
 
-void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
-  CassError rc;
+void BatchLoader::transfer2copy(CassFuture* query_future,
+                                const KeyPair& key) {
+  ResultPtr result(future2result(query_future), cass_result_free);
+  // fan out the result to all the slots waiting for this key
+  std::vector<std::pair<int, int>> dests;
+  {
+    std::lock_guard<std::mutex> lck(inflight_mtx);
+    auto it = inflight.find(key);
+    dests = std::move(it->second);
+    inflight.erase(it);
+  }
+  for (auto& d : dests) {
+    result2copy(result, d.first, d.second);
+  }
+}
+
+const CassResult* BatchLoader::future2result(CassFuture* query_future) {
   const CassResult* result = cass_future_get_result(query_future);
   if (result == NULL) {
     // Handle error
@@ -347,8 +416,13 @@ void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
     cass_future_free(query_future);
     throw std::runtime_error("Error: unable to execute query");
   }
+  return(result);
+}
+
+void BatchLoader::result2copy(ResultPtr result, int wb, int i) {
+  CassError rc;
   // decode result
-  const CassRow* row = cass_result_first_row(result);
+  const CassRow* row = cass_result_first_row(result.get());
   if (row == NULL) {
     // Handle error
     throw std::runtime_error("Error: query returned empty set");
@@ -363,14 +437,25 @@ void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
     throw std::runtime_error("Error getting bytes from result: "
                              + std::string(cass_error_desc(rc)));
   }
-  shapes[wb][i] = sz;
+  if (preallocated[wb]) {
+    if (sz != hdrs[wb][i].nbytes()) {
+      throw std::runtime_error("Error: data size differs from its hint");
+    }
+  } else {
+    parse_payload(data_payload, data, sz, hdrs[wb][i], decode_min_size);
+  }
+  if (data_payload == payload_image) {
+    // output size is known from the header, decoding can start right away
+    img_bufs[wb][i] = std::shared_ptr<uint8_t>(
+      new uint8_t[hdrs[wb][i].nbytes()], std::default_delete<uint8_t[]>());
+  }
   // label/mask/none
   std::future<void> cj;
   switch (label_t) {
   case lab_none: {
     // enqueue image copy
     cj = copy_pool->enqueue(&BatchLoader::copy_data_none, this,
-                            result, data, sz, i, wb);
+                            result, data, i, wb);
     break;
   }
   case lab_int: {
@@ -384,7 +469,7 @@ void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
     }
     // enqueue image copy + int label
     cj = copy_pool->enqueue(&BatchLoader::copy_data_int, this,
-                            result, data, sz, lab, i, wb);
+                            result, data, lab, i, wb);
     break;
   }
   case lab_img: {
@@ -397,10 +482,10 @@ void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
       throw std::runtime_error("Error getting value from result: "
                                + std::string(cass_error_desc(rc)));
     }
-    lab_shapes[wb][i] = l_sz;
+    parse_payload(label_payload, lab, l_sz, lab_hdrs[wb][i]);
     // enqueue image copy + image label (e.g., mask)
     cj = copy_pool->enqueue(&BatchLoader::copy_data_img, this,
-                            result, data, sz, lab, l_sz, i, wb);
+                            result, data, lab, i, wb);
     break;
   }
   default:
@@ -410,38 +495,72 @@ void BatchLoader::transfer2copy(CassFuture* query_future, int wb, int i) {
   {
     std::lock_guard<std::mutex> lck(alloc_mtx[wb]);
     copy_jobs[wb].emplace_back(std::move(cj));
-    // if all copy_jobs added
-    if (copy_jobs[wb].size() == bs[wb]) {
-      // allocate feature tensor
-      dali::TensorListShape t_sz(shapes[wb], bs[wb], 1);
-      v_feats[wb].Resize(t_sz, DALI_IMG_TYPE);
-      if (label_t == lab_img) {
-        // also allocate y/target tensor
-        dali::TensorListShape t_sz(lab_shapes[wb], bs[wb], 1);
-        v_labs[wb].Resize(t_sz, DALI_IMG_TYPE);
-      }
-    }
+    alloc_batch(wb);
   }
   // notify threads waiting for allocation
   alloc_cv[wb].notify_all();
 }
 
+void BatchLoader::alloc_batch(int wb) {
+  // to be called holding alloc_mtx[wb]
+  // if all copy_jobs added
+  if (copy_jobs[wb].size() == bs[wb]) {
+    // allocate feature tensor
+    dali::DALIDataType t_type;
+    auto t_sz = payload_shapes(hdrs[wb], &t_type);
+    if (preallocated[wb]) {
+      // already allocated using the size hints
+    } else if (data_payload == payload_image) {
+      // images are decoded in their own buffers, share them with no copy
+      auto& feats = v_feats[wb];
+      feats.SetContiguity(dali::BatchContiguity::Noncontiguous);
+      feats.SetSize(bs[wb]);
+      feats.set_sample_dim(3);
+      feats.set_type(t_type);
+      feats.SetLayout("HWC");
+      for (size_t j = 0; j != bs[wb]; ++j) {
+        feats.SetSample(j, img_bufs[wb][j], hdrs[wb][j].nbytes(), false,
+                        hdrs[wb][j].shape, t_type, dali::CPU_ONLY_DEVICE_ID,
+                        dali::AccessOrder::host(), "HWC");
+      }
+    } else {
+      v_feats[wb].Resize(t_sz, t_type);
+    }
+    if (label_t == lab_img) {
+      // also allocate y/target tensor
+      auto l_sz = payload_shapes(lab_hdrs[wb], &t_type);
+      v_labs[wb].Resize(l_sz, t_type);
+    } else if (v_labs[wb].num_samples() != bs[wb]) {
+      // batch closed by deadline, shrink labels
+      std::vector<int64_t> v_sz(bs[wb], 1);
+      dali::TensorListShape t_sz(v_sz, bs[wb], 1);
+      v_labs[wb].Resize(t_sz, DALI_INT_TYPE);
+    }
+  }
+}
+
 void BatchLoader::wrap_enq(CassFuture* query_future, void* v_fd) {
   futdata* fd = static_cast<futdata*>(v_fd);
   BatchLoader* batch_ldr = fd->batch_ldr;
-  int wb = fd->wb;
-  int i = fd->i;
+  KeyPair key = fd->key;
   delete(fd);
   if (batch_ldr->ooo) {
     batch_ldr->ooo_enqueue(query_future);
   } else {
-    batch_ldr->transfer2copy(query_future, wb, i);
+    batch_ldr->transfer2copy(query_future, key);
   }
 }
 
 void BatchLoader::ooo_enqueue(CassFuture* query_future) {
+  const CassResult* result = future2result(query_future);
   // receive image and check if there are now enough to create a new batch
   ooo_buf_mtx.lock();
+  if (ooo_buf.empty()) {
+    // late row of a batch closed by the deadline, keep it for the next one
+    ooo_stash.push(result);
+    ooo_buf_mtx.unlock();
+    return;
+  }
   int wb = ooo_buf.front();
   int bsz = bs[wb];
   int idx = ooo_in_bs[wb];
@@ -453,7 +572,33 @@ void BatchLoader::ooo_enqueue(CassFuture* query_future) {
   }
   ooo_buf_mtx.unlock();
   // actually handle data outside of lock section
-  transfer2copy(query_future, wb, idx);
+  result2copy(ResultPtr(result, cass_result_free), wb, idx);
+}
+
+bool BatchLoader::close_ooo_batch(int wb) {
+  std::lock_guard<std::mutex> lck(ooo_buf_mtx);
+  // only the batch currently being filled can be closed, if not empty
+  if (ooo_buf.empty() || ooo_buf.front() != wb || ooo_in_bs[wb] == 0) {
+    return false;
+  }
+  size_t arrived = ooo_in_bs[wb];
+  ooo_in_bs[wb] = 0;
+  ooo_buf.pop();
+  ++partial_batches;
+  late_rows += bs[wb] - arrived;
+  // the rows still in flight will go to the next batch
+  {
+    std::lock_guard<std::mutex> a_lck(alloc_mtx[wb]);
+    bs[wb] = arrived;
+    hdrs[wb].resize(arrived);
+    img_bufs[wb].resize(arrived);
+    if (label_t == lab_img) {
+      lab_hdrs[wb].resize(arrived);
+    }
+    alloc_batch(wb);
+  }
+  alloc_cv[wb].notify_all();
+  return true;
 }
 
 void BatchLoader::keys2transfers(const std::vector<CassUuid>& keys, int wb) {
@@ -461,6 +606,18 @@ void BatchLoader::keys2transfers(const std::vector<CassUuid>& keys, int wb) {
   CassError rc;
   for (size_t i=0; i != keys.size(); ++i) {
     CassUuid cuid = keys[i];
+    KeyPair key(cuid.time_and_version, cuid.clock_seq_and_node);
+    if (!ooo) {
+      // with in-order batches, duplicate keys (e.g., padding or hot
+      // uuids) attach to the query already in flight
+      std::lock_guard<std::mutex> lck(inflight_mtx);
+      auto& dests = inflight[key];
+      dests.emplace_back(wb, i);
+      if (dests.size() > 1) {
+        ++coalesced_keys;
+        continue;
+      }
+    }
     // prepare query
     CassStatement* statement = cass_prepared_bind(prepared);
     rc = cass_statement_bind_uuid_by_name(statement, id_col.c_str(), cuid);
@@ -472,8 +629,7 @@ void BatchLoader::keys2transfers(const std::vector<CassUuid>& keys, int wb) {
     cass_statement_free(statement);
     futdata* fd = new futdata();
     fd->batch_ldr = this;
-    fd->wb = wb;
-    fd->i = i;
+    fd->key = key;
     rc = cass_future_set_callback(query_future, wrap_enq, fd);
     if (rc != CASS_OK) {
       throw std::runtime_error("Error setting callback: "
@@ -484,13 +640,30 @@ void BatchLoader::keys2transfers(const std::vector<CassUuid>& keys, int wb) {
 }
 
 std::future<BatchImgLab> BatchLoader::start_transfers(
-                             const std::vector<CassUuid>& keys, int wb) {
+                             const std::vector<CassUuid>& keys, int wb,
+                             const std::vector<uint64_t>& hints) {
   bs[wb] = keys.size();
   copy_jobs[wb].reserve(bs[wb]);
-  allocTens(wb);  // allocate space for tensors
+  allocTens(wb, hints);  // allocate space for tensors
   if (ooo) {  // out-of-order?
-    std::unique_lock<std::mutex> lck(ooo_buf_mtx);
-    ooo_buf.push(wb);
+    std::vector<std::pair<const CassResult*, int>> stashed;
+    {
+      std::unique_lock<std::mutex> lck(ooo_buf_mtx);
+      ooo_buf.push(wb);
+      // late rows of previous batches come first
+      while (!ooo_stash.empty()
+             && static_cast<size_t>(ooo_in_bs[wb]) < bs[wb]) {
+        stashed.emplace_back(ooo_stash.front(), ooo_in_bs[wb]++);
+        ooo_stash.pop();
+      }
+      if (static_cast<size_t>(ooo_in_bs[wb]) == bs[wb]) {
+        ooo_in_bs[wb] = 0;
+        ooo_buf.pop();
+      }
+    }
+    for (auto& r : stashed) {
+      result2copy(ResultPtr(r.first, cass_result_free), wb, r.second);
+    }
   }
   // enqueue keys for transfers
   comm_job[wb] = comm_pool->enqueue(
@@ -505,7 +678,19 @@ BatchImgLab BatchLoader::wait4images(int wb) {
   // wait for all copy_jobs to be scheduled
   {
     std::unique_lock<std::mutex> lck(alloc_mtx[wb]);
-    alloc_cv[wb].wait(lck, [&]{ return copy_jobs[wb].size() == bs[wb]; });
+    auto all_in = [&]{ return copy_jobs[wb].size() == bs[wb]; };
+    if (ooo && ooo_deadline.count() > 0) {
+      auto deadline = std::chrono::steady_clock::now() + ooo_deadline;
+      while (!alloc_cv[wb].wait_until(lck, deadline, all_in)) {
+        // deadline expired: emit the rows arrived so far
+        lck.unlock();
+        close_ooo_batch(wb);
+        lck.lock();
+        deadline += ooo_deadline;
+      }
+    } else {
+      alloc_cv[wb].wait(lck, all_in);
+    }
   }
   // check if all images were copied correctly
   for (auto it = copy_jobs[wb].begin(); it != copy_jobs[wb].end(); ++it) {
@@ -528,11 +713,14 @@ void BatchLoader::check_connection() {
   }
 }
 
-void BatchLoader::prefetch_batch(const std::vector<CassUuid>& ks) {
+void BatchLoader::prefetch_batch(const std::vector<CassUuid>& ks,
+                                 const std::vector<uint64_t>& size_hints) {
+  DALI_ENFORCE(!write_buf.empty(),
+               "No free prefetch buffer: too many batches in flight");
   int wb = write_buf.front();
   write_buf.pop();
   check_connection();
-  batch[wb] = start_transfers(ks, wb);
+  batch[wb] = start_transfers(ks, wb, size_hints);
   read_buf.push(wb);
 }
 
@@ -19,11 +19,16 @@
 #include <string>
 #include <queue>
 #include <vector>
+#include <map>
+#include <memory>
 #include <future>
 #include <utility>
 #include <mutex>
+#include <atomic>
+#include <chrono>
 #include "dali/pipeline/operator/operator.h"
 #include "ThreadPool.h"
+#include "./payload_decoder.h"
 
 namespace crs4 {
 
@@ -33,16 +38,21 @@ using INT_LABEL_T = int32_t;
 using BatchRawImage = dali::TensorList<dali::CPUBackend>;
 using BatchLabel = dali::TensorList<dali::CPUBackend>;
 using BatchImgLab = std::pair<BatchRawImage, BatchLabel>;
+// query results can be shared by several slots (duplicate keys)
+using ResultPtr = std::shared_ptr<const CassResult>;
+using KeyPair = std::pair<uint64_t, uint64_t>;
 
 class BatchLoader {
  private:
   // dali types
   dali::DALIDataType DALI_INT_TYPE = DALI_INT32;
-  dali::DALIDataType DALI_IMG_TYPE = DALI_UINT8;
   // parameters
   bool connected = false;
   std::string table;
   lab_type label_t = lab_none;
+  payload_t data_payload = payload_raw;
+  payload_t label_payload = payload_raw;
+  int decode_min_size = 0;
   std::string label_col;
   std::string data_col;
   std::string id_col;
@@ -71,6 +81,8 @@ class BatchLoader {
   size_t comm_threads;  // number of communication threads
   size_t prefetch_buffers;  // multi-buffering
   bool ooo = false;  // enabling out-of-order?
+  // ooo: max wait for a batch before emitting what has arrived
+  std::chrono::milliseconds ooo_deadline{0};
   std::vector<std::mutex> alloc_mtx;
   std::vector<std::condition_variable> alloc_cv;
   std::vector<std::future<void>> comm_job;
@@ -85,26 +97,43 @@ class BatchLoader {
   std::queue<int> write_buf;
   std::queue<int> ooo_buf;  // active ooo buffers
   std::mutex ooo_buf_mtx;
-  std::vector<std::vector<int64_t>> shapes;
-  std::vector<std::vector<int64_t>> lab_shapes;
+  std::queue<const CassResult*> ooo_stash;  // late rows, no active buffer
+  std::atomic<size_t> partial_batches{0};
+  std::atomic<size_t> late_rows{0};
+  // in-flight keys (in-order only): a duplicate key, in the same batch
+  // or in another prefetch buffer, waits for the running query, whose
+  // result is then copied to all its (buffer, slot) destinations
+  std::map<KeyPair, std::vector<std::pair<int, int>>> inflight;
+  std::mutex inflight_mtx;
+  std::atomic<size_t> coalesced_keys{0};
+  std::vector<std::vector<PayloadHeader>> hdrs;
+  std::vector<std::vector<PayloadHeader>> lab_hdrs;
+  // decoded images, filled before the batch is allocated
+  std::vector<std::vector<std::shared_ptr<uint8_t>>> img_bufs;
+  // features allocated at prefetch time, using the size hints
+  std::vector<char> preallocated;
   // methods
   void connect();
   void check_connection();
-  void copy_data_none(const CassResult* result, const cass_byte_t* data,
-                      size_t sz, int off, int wb);
-  void copy_data_int(const CassResult* result, const cass_byte_t* data,
-                     size_t sz, cass_int32_t lab, int off, int wb);
-  void copy_data_img(const CassResult* result, const cass_byte_t* data,
-                     size_t sz, const cass_byte_t* lab, size_t l_sz,
-                     int off, int wb);
+  void copy_data_none(ResultPtr result, const cass_byte_t* data,
+                      int off, int wb);
+  void copy_data_int(ResultPtr result, const cass_byte_t* data,
+                     cass_int32_t lab, int off, int wb);
+  void copy_data_img(ResultPtr result, const cass_byte_t* data,
+                     const cass_byte_t* lab, int off, int wb);
   std::future<BatchImgLab> start_transfers(const std::vector<CassUuid>& keys,
-                                           int wb);
+                                           int wb,
+                                           const std::vector<uint64_t>& hints);
   BatchImgLab wait4images(int wb);
   void keys2transfers(const std::vector<CassUuid>& keys, int wb);
-  void transfer2copy(CassFuture* query_future, int wb, int i);
+  void transfer2copy(CassFuture* query_future, const KeyPair& key);
+  const CassResult* future2result(CassFuture* query_future);
+  void result2copy(ResultPtr result, int wb, int i);
+  void alloc_batch(int wb);
   void ooo_enqueue(CassFuture* query_future);
+  bool close_ooo_batch(int wb);
   static void wrap_enq(CassFuture* query_future, void* v_fd);
-  void allocTens(int wb);
+  void allocTens(int wb, const std::vector<uint64_t>& hints);
   void load_own_cert_file(std::string file, CassSsl* ssl);
   void load_own_key_file(std::string file, CassSsl* ssl, std::string passw);
   void load_trusted_cert_file(std::string file, CassSsl* ssl);
@@ -118,17 +147,30 @@ class BatchLoader {
               std::string ssl_certificate, std::string ssl_own_certificate,
               std::string ssl_own_key, std::string ssl_own_key_pass,
               size_t io_threads, size_t prefetch_buffers, size_t copy_threads,
-              size_t wait_threads, size_t comm_threads, bool ooo);
+              size_t wait_threads, size_t comm_threads, bool ooo,
+              int ooo_deadline = 0, std::string data_decoding = "none",
+              std::string label_decoding = "none", int decode_min_size = 0);
   ~BatchLoader();
-  void prefetch_batch(const std::vector<CassUuid>& keys);
+  // size_hints: optional data size of each key, to allocate the batch
+  // in advance (only for raw data, without ooo)
+  void prefetch_batch(const std::vector<CassUuid>& keys,
+                      const std::vector<uint64_t>& size_hints = {});
   BatchImgLab blocking_get_batch();
   void ignore_batch();
+  size_t get_partial_batches() const {
+    return partial_batches;
+  }
+  size_t get_late_rows() const {
+    return late_rows;
+  }
+  size_t get_coalesced_keys() const {
+    return coalesced_keys;
+  }
 };
 
 struct futdata {
   BatchLoader* batch_ldr;
-  int wb;
-  int i;
+  KeyPair key;
 };
 
 }  // namespace crs4
@@ -28,60 +28,85 @@ CassandraDecoupled::CassandraDecoupled(const dali::OpSpec &spec) :
 
 bool CassandraDecoupled::SetupImpl(std::vector<dali::OutputDesc> &output_desc,
                            const dali::Workspace &ws) {
-  // create mini batches from list
-  if (curr_prefetch == 0 && HasDataInQueue()) {
-    uuids.Reset();
-    uuids.set_pinned(false);
+  if (curr_prefetch == 0 && requests.empty()) {
+    // nothing to return: wait for some input if blocking, fail otherwise
+    HandleDataAvailability();
+  }
+  // queue the lists of uuids fed so far, as long as needed to keep the
+  // prefetch window full across the boundaries of the requests
+  while (HasDataInQueue() && pending_minibatches() <= prefetch_buffers) {
     list_to_minibatches(ws);
   }
   return false;
 }
 
+size_t CassandraDecoupled::pending_minibatches() const {
+  size_t num = 0;
+  for (auto &req : requests) {
+    num += req->intervals.size() - req->input_interval;
+  }
+  return num;
+}
+
 void CassandraDecoupled::prefetch_one() {
   // exit if no data to prefetch
-  if (input_interval >= intervals.size())
+  if (requests.empty())
     return;
   // prepare and prefetch
-  auto start = intervals[input_interval].first;
-  auto end = intervals[input_interval].second;
-  ++input_interval;
-  auto bs = end-start;
-  auto cass_uuids = std::vector<CassUuid>(bs);
-  size_t ci = 0;
-  for (auto i=start; i != end; ++i, ++ci) {
-    auto d_ptr = uuids[i].data<uint64_t>();
-    auto c_uuid = &cass_uuids[ci];
-    c_uuid->time_and_version = *(d_ptr++);
-    c_uuid->clock_seq_and_node = *d_ptr;
+  auto req = requests.front();
+  auto start = req->intervals[req->input_interval].first;
+  auto end = req->intervals[req->input_interval].second;
+  inflight.emplace_back(req, req->input_interval);
+  std::vector<CassUuid> cass_uuids(req->keys.begin() + start,
+                                   req->keys.begin() + end);
+  std::vector<uint64_t> size_hints;
+  if (!req->size_hints.empty()) {
+    size_hints.assign(req->size_hints.begin() + start,
+                      req->size_hints.begin() + end);
+  }
+  if (++req->input_interval == req->intervals.size()) {
+    // request fully prefetched, keys are no longer needed
+    req->keys = std::vector<CassUuid>();
+    req->size_hints = std::vector<uint64_t>();
+    requests.pop_front();
   }
-  batch_ldr->prefetch_batch(cass_uuids);
+  batch_ldr->prefetch_batch(cass_uuids, size_hints);
   ++curr_prefetch;
 }
 
 void CassandraDecoupled::fill_buffers(dali::Workspace &ws) {
-  // start prefetching
-  int num_buff = (slow_start > 0 && prefetch_buffers > 0) ? 1 : prefetch_buffers;
-  for (int i=0; i < num_buff && ok_to_fill(); ++i) {
+  // start prefetching, without exceeding the buffers of the loader
+  // (called with curr_prefetch < prefetch_buffers)
+  size_t room = prefetch_buffers - curr_prefetch;
+  size_t num_buff = (slow_start > 0 && prefetch_buffers > 0) ? 1 : room;
+  for (size_t i=0; i < num_buff && ok_to_fill(); ++i) {
     prefetch_one();
   }
 }
 
 void CassandraDecoupled::list_to_minibatches(const dali::Workspace &ws) {
   DALI_ENFORCE(HasDataInQueue(), "No UUIDs have been provided");
-  // forward input data to uuids tensorlist
+  // forward input data, with its id, to a new request
+  auto req = std::make_shared<Request>();
+  feed_buf.Reset();
+  feed_buf.set_pinned(false);
   auto &thread_pool = ws.GetThreadPool();
-  ForwardCurrentData(uuids, null_data_id, thread_pool);
-  size_t full_sz = uuids.num_samples();
-  intervals.clear();
-  input_interval = 0;
+  ForwardCurrentData(feed_buf, req->data_id, thread_pool);
+  size_t full_sz = feed_buf.num_samples();
+  // with no_copy, the buffer fed by the user is not referenced afterwards
+  read_keys(feed_buf, 0, full_sz, req->keys, req->size_hints);
+  feed_buf.Reset();
   // split uuids in minibatches
   size_t floor_sz = mini_batch_size * (full_sz / mini_batch_size);
   for (size_t i = 0; i < floor_sz; i += mini_batch_size) {
-    intervals.push_back(std::make_pair(i, i + mini_batch_size));
+    req->intervals.push_back(std::make_pair(i, i + mini_batch_size));
   }
   // handle last batch
   if (floor_sz != full_sz) {
-    intervals.push_back(std::make_pair(floor_sz, full_sz));
+    req->intervals.push_back(std::make_pair(floor_sz, full_sz));
+  }
+  if (!req->intervals.empty()) {
+    requests.push_back(std::move(req));
   }
 }
 
@@ -90,18 +115,31 @@ void CassandraDecoupled::RunImpl(dali::Workspace &ws) {
   if (curr_prefetch < prefetch_buffers) {
     fill_buffers(ws);
   }
-  // try to prefetch one minibatch
-  prefetch_one();
+  // try to prefetch one minibatch, using the extra buffer of the loader
+  if (curr_prefetch <= prefetch_buffers) {
+    prefetch_one();
+  }
+  DALI_ENFORCE(curr_prefetch > 0, "No UUIDs have been provided");
   // consume data
   output = batch_ldr->blocking_get_batch();
   --curr_prefetch;
+  auto [req, mb] = inflight.front();
+  inflight.pop_front();
   // share features with output
   auto &features = ws.Output<dali::CPUBackend>(0);
   features.ShareData(output.first);
   // share labels with output
   auto &labels = ws.Output<dali::CPUBackend>(1);
   labels.ShareData(output.second);
-  SetDepletedOperatorTrace(ws, !(curr_prefetch > 0 || HasDataInQueue()));
+  set_loader_traces(ws);
+  // attribute the minibatch to its request
+  if (req->data_id) {
+    ws.SetOperatorTrace("data_id", *req->data_id);
+  }
+  bool last = (mb + 1 == req->intervals.size());
+  ws.SetOperatorTrace("request_done", last ? "true" : "false");
+  SetDepletedOperatorTrace(ws, !(curr_prefetch > 0 || !requests.empty()
+                                 || HasDataInQueue()));
 }
 
 }  // namespace crs4
@@ -111,7 +149,14 @@ void CassandraDecoupled::RunImpl(dali::Workspace &ws) {
 DALI_REGISTER_OPERATOR(crs4__cassandra_decoupled, crs4::CassandraDecoupled, dali::CPU);
 
 DALI_SCHEMA(crs4__cassandra_decoupled)
-.DocStr("Reads UUIDs as a large batch and returns images and labels/masks")
+.DocStr(R"code(Reads UUIDs as a large batch and returns images and labels/masks.
+
+Several lists of UUIDs can be fed in advance: they are queued and their
+mini-batches are prefetched back to back, across request boundaries.
+Each output mini-batch carries the operator traces ``data_id`` (the id
+passed with the list, if any) and ``request_done`` (``true`` for the
+last mini-batch of a list). With ``ooo_deadline``, late rows may move to
+the next mini-batch, possibly of the next list.)code")
 .NumInput(0)
 .NumOutput(2)
 .AddOptionalArg("mini_batch_size",
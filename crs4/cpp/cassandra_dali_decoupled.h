@@ -20,6 +20,9 @@
 #include <string>
 #include <utility>
 #include <cmath>
+#include <deque>
+#include <memory>
+#include <optional>
 #include "dali/pipeline/operator/builtin/input_operator.h"
 #include "dali/operators/reader/reader_op.h"
 #include "./cassandra_dali_interactive.h"
@@ -37,13 +40,26 @@ class CassandraDecoupled : public CassandraInteractive {
   void RunImpl(dali::Workspace &ws) override;
 
  private:
+  // a list of uuids fed as a single input, split in minibatches
+  struct Request {
+    std::vector<CassUuid> keys;
+    std::vector<uint64_t> size_hints;
+    std::optional<std::string> data_id;
+    std::vector<std::pair<size_t, size_t>> intervals;
+    size_t input_interval = 0;  // next minibatch to be prefetched
+  };
+  using RequestPtr = std::shared_ptr<Request>;
   int mini_batch_size;
   void prefetch_one();
   void list_to_minibatches(const dali::Workspace &ws);
   void fill_buffers(dali::Workspace &ws);
-  std::vector<std::pair<size_t, size_t>> intervals;
-  size_t input_interval = 0;
+  size_t pending_minibatches() const;
+  // requests with minibatches still to be prefetched
+  std::deque<RequestPtr> requests;
+  // request and index of the prefetched minibatches, in order
+  std::deque<std::pair<RequestPtr, size_t>> inflight;
   BatchImgLab output;
+  dali::TensorList<dali::CPUBackend> feed_buf;  // receives the fed lists
 };
 
 }  // namespace crs4
@@ -44,6 +44,10 @@ CassandraInteractive::CassandraInteractive(const dali::OpSpec &spec) :
   wait_threads(spec.GetArgument<int>("wait_threads")),
   comm_threads(spec.GetArgument<int>("comm_threads")),
   ooo(spec.GetArgument<bool>("ooo")),
+  ooo_deadline(spec.GetArgument<int>("ooo_deadline")),
+  data_decoding(spec.GetArgument<std::string>("data_decoding")),
+  label_decoding(spec.GetArgument<std::string>("label_decoding")),
+  decode_min_size(spec.GetArgument<int>("decode_min_size")),
   cow_dilute(slow_start -1) {
   DALI_ENFORCE(prefetch_buffers >= 0,
      "prefetch_buffers should be non-negative.");
@@ -51,6 +55,14 @@ CassandraInteractive::CassandraInteractive(const dali::OpSpec &spec) :
      "label_type can only be int, image or none.");
   DALI_ENFORCE(slow_start >= 0,
      "slow_start should be either 0 (disabled) or >= 1 (prefetch dilution).");
+  DALI_ENFORCE(ooo_deadline >= 0,
+     "ooo_deadline should be either 0 (disabled) or a positive number of ms.");
+  DALI_ENFORCE(ooo_deadline == 0 || ooo,
+     "ooo_deadline can only be used with ooo=True.");
+  DALI_ENFORCE(label_decoding == "none" || label_type == "blob",
+     "label_decoding can only be used with label_type blob.");
+  DALI_ENFORCE(label_decoding != "image",
+     "image decoding is only supported for data_decoding.");
   DALI_ENFORCE(batch_size * prefetch_buffers <= 32768 * io_threads,
      "please satisfy this constraint: batch_size * prefetch_buffers <= 32768 * io_threads");
   batch_ldr = new BatchLoader(table, label_type, label_col, data_col, id_col,
@@ -58,32 +70,53 @@ CassandraInteractive::CassandraInteractive(const dali::OpSpec &spec) :
                         cloud_config, use_ssl, ssl_certificate,
                         ssl_own_certificate, ssl_own_key, ssl_own_key_pass,
                         io_threads, 1 + prefetch_buffers, copy_threads,
-                        wait_threads, comm_threads, ooo);
+                        wait_threads, comm_threads, ooo, ooo_deadline,
+                        data_decoding, label_decoding, decode_min_size);
 }
 
 void CassandraInteractive::prefetch_one() {
-  // enforce max batch size
-  DALI_ENFORCE(uuids.num_samples() <= batch_size,
-       dali::make_string("batch_size must be <= ", batch_size, ", found ",
-                      uuids.num_samples(), " samples."));
-  // prepare and prefetch
-  auto bs = uuids.num_samples();
-  auto cass_uuids = std::vector<CassUuid>(bs);
-  for (auto i=0; i != bs; ++i) {
-    auto d_ptr = uuids[i].data<uint64_t>();
-    auto c_uuid = &cass_uuids[i];
-    c_uuid->time_and_version = *(d_ptr++);
-    c_uuid->clock_seq_and_node = *d_ptr;
-  }
-  batch_ldr->prefetch_batch(cass_uuids);
+  batch_ldr->prefetch_batch(in_keys, in_hints);
   ++curr_prefetch;
 }
 
+void CassandraInteractive::read_keys(
+    const dali::TensorList<dali::CPUBackend>& src, size_t start, size_t end,
+    std::vector<CassUuid>& keys, std::vector<uint64_t>& size_hints) {
+  // each sample is a uuid as two u64, optionally followed by the size
+  // of its data, used as a hint for allocating the batch in advance
+  keys.resize(end - start);
+  size_hints.clear();
+  bool hinted = true;
+  for (size_t i = start; i != end; ++i) {
+    auto d_ptr = src[i].data<uint64_t>();
+    auto c_uuid = &keys[i - start];
+    c_uuid->time_and_version = d_ptr[0];
+    c_uuid->clock_seq_and_node = d_ptr[1];
+    hinted = hinted && src[i].shape()[0] > 2;
+    if (hinted) {
+      size_hints.push_back(d_ptr[2]);
+    }
+  }
+  if (!hinted) {
+    size_hints.clear();
+  }
+}
+
 void CassandraInteractive::try_read_input(const dali::Workspace &ws) {
   if (HasDataInQueue()) {
     // forward input data to uuids tensorlist
     auto &thread_pool = ws.GetThreadPool();
     ForwardCurrentData(uuids, null_data_id, thread_pool);
+    // enforce max batch size
+    DALI_ENFORCE(uuids.num_samples() <= batch_size,
+         dali::make_string("batch_size must be <= ", batch_size, ", found ",
+                        uuids.num_samples(), " samples."));
+    // read the keys right away, so that with no_copy the buffer fed by
+    // the user is not referenced afterwards
+    read_keys(uuids, 0, uuids.num_samples(), in_keys, in_hints);
+    if (no_copy_) {
+      uuids.Reset();
+    }
     input_read = true;
   } else {
     input_read = false;
@@ -95,6 +128,11 @@ bool CassandraInteractive::SetupImpl(std::vector<dali::OutputDesc> &output_desc,
   uuids.Reset();
   uuids.set_pinned(false);
   try_read_input(ws);
+  if (!input_read && curr_prefetch == 0) {
+    // nothing to return: wait for some input if blocking, fail otherwise
+    HandleDataAvailability();
+    try_read_input(ws);
+  }
   return false;
 }
 
@@ -145,9 +183,25 @@ void CassandraInteractive::RunImpl(dali::Workspace &ws) {
   auto &labels = ws.Output<dali::CPUBackend>(1);
   labels.ShareData(batch.second);
   --curr_prefetch;
+  set_loader_traces(ws);
   SetDepletedOperatorTrace(ws, !(curr_prefetch > 0 || HasDataInQueue()));
 }
 
+void CassandraInteractive::set_loader_traces(dali::Workspace &ws) {
+  // how many batches were emitted partially because of the deadline
+  if (ooo_deadline > 0) {
+    ws.SetOperatorTrace("partial_batches",
+                        std::to_string(batch_ldr->get_partial_batches()));
+    ws.SetOperatorTrace("late_rows",
+                        std::to_string(batch_ldr->get_late_rows()));
+  }
+  // how many duplicate keys were served by a query already in flight
+  if (!ooo) {
+    ws.SetOperatorTrace("coalesced_keys",
+                        std::to_string(batch_ldr->get_coalesced_keys()));
+  }
+}
+
 }  // namespace crs4
 
 // register CassandraInteractive class
@@ -155,7 +209,10 @@ void CassandraInteractive::RunImpl(dali::Workspace &ws) {
 DALI_REGISTER_OPERATOR(crs4__cassandra_interactive, crs4::CassandraInteractive, dali::CPU);
 
 DALI_SCHEMA(crs4__cassandra_interactive)
-.DocStr("Reads UUIDs via feed_input and returns images and labels/masks")
+.DocStr(R"code(Reads UUIDs via feed_input and returns images and labels/masks.
+Each UUID is fed as two uint64, optionally followed by the size in
+bytes of its data, used (with data_decoding=none and ooo=False) to
+allocate the batch in advance.)code")
 .NumInput(0)
 .NumOutput(2)
 .AddRandomSeedArg()
@@ -189,9 +246,31 @@ DALI_SCHEMA(crs4__cassandra_interactive)
    R"(Number of threads copying data in parallel)", 2)
 .AddOptionalArg("wait_threads", R"(Parallelism for waiting threads)", 2)
 .AddOptionalArg("comm_threads", R"(Parallelism for communication threads)", 2)
-.AddOptionalArg("blocking", R"(block until the data is available)", true)
-.AddOptionalArg("no_copy", R"(should DALI copy the buffer when ``feed_input`` is called?)", false)
+.AddOptionalArg("blocking",
+   R"code(When no batch is in flight and no input has been fed, wait for
+some input instead of failing. Batches already in flight are returned
+without waiting for new input anyway.)code", true)
+.AddOptionalArg("no_copy",
+   R"code(Do not copy the buffer passed to ``feed_input``: the UUIDs are
+read from it when it is dequeued, and it is not referenced afterwards.
+The buffer must stay valid until then.)code", false)
 .AddOptionalArg("ooo", R"(Enable out-of-order batches)", false)
 .AddOptionalArg("slow_start", R"(How much to dilute prefetching)", 0)
+.AddOptionalArg<std::string>("data_decoding",
+   R"code(How to interpret the data blobs: none (bytes, returned as uint8),
+npy (NumPy files), tensor (see crs4.cassandra_utils.encode_tensor) or
+image (JPEG/PNG, decoded to HWC RGB on CPU by the copy threads).
+Typed payloads are returned with their own type and shape.)code", "none")
+.AddOptionalArg<std::string>("label_decoding",
+   R"code(Same as data_decoding, for blob labels (except image).)code",
+   "none")
+.AddOptionalArg("decode_min_size",
+   R"code(With data_decoding=image: downscale JPEGs while decoding, in the
+DCT domain, as much as possible keeping the shorter side >=
+decode_min_size. 0 disables downscaling.)code", 0)
+.AddOptionalArg("ooo_deadline",
+   R"code(Out-of-order only: max time in ms to wait for a batch. When it
+expires the rows arrived so far are returned as a smaller batch, and the
+late rows go to the next one. 0 disables it.)code", 0)
 .AddParent("InputOperatorBase");
 
@@ -89,12 +89,16 @@ class CassandraInteractive : public dali::InputOperator<dali::CPUBackend> {
   size_t prefetch_buffers;
   int slow_start;  // prefetch dilution
   bool ok_to_fill();
+  virtual void try_read_input(const dali::Workspace &ws);
+  void set_loader_traces(dali::Workspace &ws);
+  void read_keys(const dali::TensorList<dali::CPUBackend>& src,
+                 size_t start, size_t end, std::vector<CassUuid>& keys,
+                 std::vector<uint64_t>& size_hints);
 
  private:
   void prefetch_one();
   void fill_buffer(dali::Workspace &ws);
   void fill_buffers(dali::Workspace &ws);
-  void try_read_input(const dali::Workspace &ws);
   // variables
   std::string cloud_config;
   std::vector<std::string> cassandra_ips;
@@ -116,8 +120,15 @@ class CassandraInteractive : public dali::InputOperator<dali::CPUBackend> {
   size_t wait_threads;
   size_t comm_threads;
   bool ooo;
+  int ooo_deadline;
+  std::string data_decoding;
+  std::string label_decoding;
+  int decode_min_size;
   int cow_dilute;  // counter for prefetch dilution
   bool input_read = false;
+  // keys (and size hints) of the last input read, to be prefetched
+  std::vector<CassUuid> in_keys;
+  std::vector<uint64_t> in_hints;
   dali::TensorLayout in_layout_ = "B";  // Byte stream
 };
 
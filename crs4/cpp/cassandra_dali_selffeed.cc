@@ -14,6 +14,8 @@
 
 #include <iostream>
 #include <fstream>
+#include <numeric>
+#include <sstream>
 #include "./cassandra_dali_selffeed.h"
 
 namespace crs4 {
@@ -21,68 +23,258 @@ namespace crs4 {
 CassandraSelfFeed::CassandraSelfFeed(const dali::OpSpec &spec) :
   CassandraInteractive(spec),
   source_uuids(spec.GetArgument<crs4::StrUUIDs>("source_uuids")),
+  uuids_file(spec.GetArgument<std::string>("uuids_file")),
+  split_file(spec.GetArgument<std::string>("split_file")),
+  split_index(spec.GetArgument<std::vector<int>>("split_index")),
   shard_id(spec.GetArgument<int>("shard_id")),
   num_shards(spec.GetArgument<int>("num_shards")),
   shuffle_every_epoch(spec.GetArgument<bool>("shuffle_every_epoch")),
-  loop_forever(spec.GetArgument<bool>("loop_forever")) {
-  DALI_ENFORCE(source_uuids.size() > 0,
-               "please provide a non-empty list of source_uuids");
+  loop_forever(spec.GetArgument<bool>("loop_forever")),
+  replica_affinity(spec.GetArgument<bool>("replica_affinity")),
+  lazy_shuffle(spec.GetArgument<bool>("lazy_shuffle")) {
+  DALI_ENFORCE(!source_uuids.empty() + !uuids_file.empty()
+               + !split_file.empty() <= 1,
+               "only one of source_uuids, uuids_file and split_file "
+               "can be used");
+  DALI_ENFORCE(!replica_affinity || !uuids_file.empty()
+               || !split_file.empty(),
+               "replica_affinity requires a uuids_file or a split_file");
+  DALI_ENFORCE(!lazy_shuffle || !replica_affinity,
+               "lazy_shuffle cannot be used with replica_affinity");
+  // the permutation only matters when reshuffling
+  lazy_shuffle = lazy_shuffle && shuffle_every_epoch;
   DALI_ENFORCE(num_shards > shard_id,
                "num_shards needs to be greater than shard_id");
-  convert_uuids();
-  set_shard_sizes();
-  // feed first epoch
+  if (!split_file.empty()) {
+    UuidFile uf(split_file);
+    select_splits(uf);
+    dataset_size = split_rows.size();
+    DALI_ENFORCE(dataset_size > 0,
+                 "please provide non-empty splits in split_index");
+    set_shard_sizes();
+    load_uuids_file(uf);
+  } else if (uuids_file.empty()) {
+    dataset_size = source_uuids.size();
+    DALI_ENFORCE(dataset_size > 0,
+                 "please provide a non-empty list of source_uuids");
+    set_shard_sizes();
+    convert_uuids();
+  } else {
+    UuidFile uf(uuids_file);
+    dataset_size = uf.size();
+    DALI_ENFORCE(dataset_size > 0,
+                 "please provide a non-empty uuids_file");
+    set_shard_sizes();
+    load_uuids_file(uf);
+  }
+  shard_begin = u64_uuids.begin() + (shard_pos - loaded_pos);
+  shard_end = shard_begin + shard_size;
+  if (replica_affinity) {
+    order.resize(dataset_size);
+    std::iota(order.begin(), order.end(), 0);
+    set_replica_pool();
+  }
+  // batches are fed by the operator itself, never wait for input
+  blocking_ = false;
+  // set up tensorlist buffer for batches
+  std::vector<int64_t> v_sz(batch_size, size_hints ? 3 : 2);
+  dali::TensorListShape t_sz(v_sz, batch_size, 1);
+  tl_batch.set_pinned(false);
+  tl_batch.Resize(t_sz, dali::DALIDataType::DALI_UINT64);
+  // prepare first epoch, batches are fed on demand
   feed_new_epoch();
-  if (loop_forever) {
-    // feed also second epoch
-    feed_new_epoch();
+}
+
+void CassandraSelfFeed::try_read_input(const dali::Workspace &ws) {
+  // keep the input queue one batch ahead of the reader
+  if (!HasDataInQueue()) {
+    feed_batch();
+  }
+  CassandraInteractive::try_read_input(ws);
+  if (!HasDataInQueue()) {
+    feed_batch();
+  }
+}
+
+void CassandraSelfFeed::RunImpl(dali::Workspace &ws) {
+  CassandraInteractive::RunImpl(ws);
+  // keep track of the position of the returned batches
+  if (++read_batch == batches_per_epoch && loop_forever) {
+    ++read_epoch;
+    read_batch = 0;
   }
 }
 
-bool CassandraSelfFeed::SetupImpl(std::vector<dali::OutputDesc> &output_desc,
-                           const dali::Workspace &ws) {
-  // refeed uuids at the end of the epoch
-  if (--left_batches == 0 && loop_forever) {
+void CassandraSelfFeed::SaveState(dali::OpCheckpoint &cpt,
+                                  dali::AccessOrder order) {
+  cpt.MutableCheckpointState() =
+    SelfFeedState{read_epoch, read_batch, seed, shard_id, num_shards};
+}
+
+void CassandraSelfFeed::RestoreState(const dali::OpCheckpoint &cpt) {
+  auto &st = cpt.CheckpointState<SelfFeedState>();
+  DALI_ENFORCE(st.seed == seed && st.shard_id == shard_id
+               && st.num_shards == num_shards,
+               "checkpoint does not match seed, shard_id and num_shards");
+  DALI_ENFORCE(st.batch <= batches_per_epoch,
+               dali::make_string("checkpoint batch ", st.batch,
+                                 " is beyond the end of the epoch"));
+  DALI_ENFORCE(curr_prefetch == 0 && !HasDataInQueue(),
+               "reader state can only be restored before reading");
+  // redo the shuffles of the past epochs, no data is read
+  while (current_epoch < st.epoch) {
     feed_new_epoch();
   }
-  return CassandraInteractive::SetupImpl(output_desc, ws);
+  next_batch = st.batch;
+  read_epoch = st.epoch;
+  read_batch = st.batch;
 }
 
-void CassandraSelfFeed::feed_epoch() {
-  // set up tensorlist buffer for batches
-  std::vector<int64_t> v_sz(batch_size, 2);
-  dali::TensorListShape t_sz(v_sz, batch_size, 1);
-  auto tl_batch = dali::TensorList<dali::CPUBackend>();
-  tl_batch.set_pinned(false);
-  tl_batch.Resize(t_sz, dali::DALIDataType::DALI_UINT64);
-  // feed batches
-  auto it = shard_begin;
-  size_t i = 0;
-  int num;
-  while (i < pad_shard_size - batch_size) {
-    for (num = 0; num != batch_size ; ++i, ++num, ++it) {
-      auto ten = (uint64_t*) tl_batch.raw_mutable_tensor(num);
-      ten[0] = it->first;
-      ten[1] = it->second;
+std::string CassandraSelfFeed::SerializeCheckpoint(
+    const dali::OpCheckpoint &cpt) const {
+  auto &st = cpt.CheckpointState<SelfFeedState>();
+  std::stringstream ss;
+  ss << st.epoch << ' ' << st.batch << ' ' << st.seed << ' '
+     << st.shard_id << ' ' << st.num_shards;
+  return ss.str();
+}
+
+void CassandraSelfFeed::DeserializeCheckpoint(dali::OpCheckpoint &cpt,
+    const std::string &data) const {
+  SelfFeedState st;
+  std::stringstream ss(data);
+  ss >> st.epoch >> st.batch >> st.seed >> st.shard_id >> st.num_shards;
+  DALI_ENFORCE(!ss.fail(), "malformed checkpoint: " + data);
+  cpt.MutableCheckpointState() = st;
+}
+
+void CassandraSelfFeed::feed_new_epoch() {
+  current_epoch++;
+  next_batch = 0;
+  if (!shuffle_every_epoch && (!replica_affinity || current_epoch > 0)) {
+    // same shard as in previous epoch
+    return;
+  }
+  if (lazy_shuffle) {
+    // no shuffling, positions are permuted as batches are fed
+    perm = FeistelPermutation(dataset_size, seed + current_epoch);
+    return;
+  }
+  // get the shard of the new epoch, prepared in background if possible
+  if (next_epoch.valid()) {
+    next_epoch.get();
+  } else {
+    prepare_epoch(current_epoch);
+  }
+  shard_uuids.swap(next_shard_uuids);
+  shard_begin = shard_uuids.begin();
+  shard_end = shard_uuids.end();
+  // reshuffle for next epoch while this one is being read
+  if (shuffle_every_epoch && loop_forever) {
+    next_epoch = std::async(std::launch::async,
+                            &CassandraSelfFeed::prepare_epoch, this,
+                            current_epoch + 1);
+  }
+}
+
+void CassandraSelfFeed::prepare_epoch(int epoch) {
+  if (shuffle_every_epoch) {
+    std::mt19937 g(seed + epoch);
+    if (replica_affinity) {
+      std::shuffle(order.begin(), order.end(), g);
+    } else {
+      std::shuffle(u64_uuids.begin(), u64_uuids.end(), g);
     }
-    SetDataSource(tl_batch);  // feed batch
   }
-  // handle last batch
-  // 1) fill what remains
-  auto last_elem = shard_begin;
-  for (num = 0; i < shard_size; ++i, ++num, ++it) {
-    auto ten = (uint64_t*) tl_batch.raw_mutable_tensor(num);
-    ten[0] = it->first;
-    ten[1] = it->second;
-    last_elem = it;
+  if (replica_affinity) {
+    assign_replica_shard();
+  } else {
+    auto begin = u64_uuids.begin() + (shard_pos - loaded_pos);
+    next_shard_uuids.assign(begin, begin + shard_size);
   }
-  // 2) pad using last element
-  for (; i < pad_shard_size; ++i, ++num) {
+}
+
+void CassandraSelfFeed::set_replica_pool() {
+  // count the uuids each shard takes among those close to it, the
+  // others form a common pool used to even out the shard sizes
+  std::vector<size_t> taken(num_shards, 0);
+  for (auto a : affinity) {
+    if (a >= 0 && a < num_shards && taken[a] < shard_size) {
+      ++taken[a];
+    }
+  }
+  pool_size = dataset_size;
+  pool_offset = 0;
+  for (int s = 0; s != num_shards; ++s) {
+    pool_size -= taken[s];
+    if (s < shard_id) {
+      pool_offset += shard_size - taken[s];
+    }
+  }
+  pool_deficit = shard_size - taken[shard_id];
+}
+
+void CassandraSelfFeed::assign_replica_shard() {
+  // all the shards scan the same epoch order, so that they agree on
+  // which uuids are taken and on the pool positions
+  next_shard_uuids.clear();
+  next_shard_uuids.reserve(shard_size);
+  std::vector<size_t> taken(num_shards, 0);
+  size_t p = 0;  // position in pool
+  for (auto i : order) {
+    auto a = affinity[i];
+    if (a >= 0 && a < num_shards && taken[a] < shard_size) {
+      if (a == shard_id) {
+        next_shard_uuids.push_back(u64_uuids[i]);
+      }
+      ++taken[a];
+    } else {
+      // get pool_deficit uuids, cyclically starting from pool_offset
+      if ((p + pool_size - pool_offset % pool_size) % pool_size
+          < pool_deficit) {
+        next_shard_uuids.push_back(u64_uuids[i]);
+      }
+      ++p;
+    }
+  }
+  // pad shard if the pool was too small
+  if (next_shard_uuids.empty()) {
+    next_shard_uuids.push_back(u64_uuids[order[0]]);
+  }
+  while (next_shard_uuids.size() < shard_size) {
+    next_shard_uuids.push_back(next_shard_uuids.back());
+  }
+}
+
+void CassandraSelfFeed::feed_batch() {
+  if (next_batch == batches_per_epoch) {
+    // current epoch fully fed
+    if (!loop_forever) {
+      return;
+    }
+    feed_new_epoch();
+  }
+  size_t i = next_batch * batch_size;
+  for (int num = 0; num != batch_size; ++num, ++i) {
+    // pad last batch using last element of the shard
+    auto& key = shard_key(std::min(i, shard_size - 1));
     auto ten = (uint64_t*) tl_batch.raw_mutable_tensor(num);
-    ten[0] = last_elem->first;
-    ten[1] = last_elem->second;
+    ten[0] = key.first;
+    ten[1] = key.second;
+    if (size_hints) {
+      ten[2] = key.size;
+    }
+  }
+  SetDataSource(tl_batch);  // feed batch
+  ++next_batch;
+}
+
+const U64Key& CassandraSelfFeed::shard_key(size_t i) const {
+  if (lazy_shuffle) {
+    // i-th element of the shard in the permuted dataset
+    return u64_uuids[perm(shard_pos + i)];
   }
-  SetDataSource(tl_batch);  // feed last batch
+  return *(shard_begin + i);
 }
 
 void CassandraSelfFeed::convert_uuids() {
@@ -92,8 +284,63 @@ void CassandraSelfFeed::convert_uuids() {
   for (auto id = source_uuids.begin(); id != source_uuids.end(); ++id, ++num) {
     CassUuid cuid;
     cass_uuid_from_string(id->c_str(), &cuid);
-    u64_uuids[num] = std::make_pair(cuid.time_and_version, cuid.clock_seq_and_node);
+    u64_uuids[num] = U64Key{static_cast<int64_t>(cuid.time_and_version),
+                            static_cast<int64_t>(cuid.clock_seq_and_node)};
   }
+  // strings are no longer needed
+  StrUUIDs().swap(source_uuids);
+}
+
+void CassandraSelfFeed::select_splits(const UuidFile& uf) {
+  // merge the selected splits, in the given order
+  DALI_ENFORCE(uf.num_splits() > 0,
+               "split_file has no splits: " + split_file);
+  DALI_ENFORCE(!split_index.empty(),
+               "split_file requires split_index");
+  for (auto s : split_index) {
+    DALI_ENFORCE(s >= 0 && static_cast<size_t>(s) < uf.num_splits(),
+                 dali::make_string("split_index ", s, " out of range, ",
+                                   split_file, " has ", uf.num_splits(),
+                                   " splits"));
+    auto rows = uf.split(s);
+    for (size_t i = 0; i != uf.split_size(s); ++i) {
+      DALI_ENFORCE(rows[i] < uf.size(),
+                   "invalid uuid index in split_file: " + split_file);
+    }
+    split_rows.insert(split_rows.end(), rows, rows + uf.split_size(s));
+  }
+}
+
+void CassandraSelfFeed::load_uuids_file(const UuidFile& uf) {
+  // without reshuffling, only the uuids of this shard are needed
+  bool full = shuffle_every_epoch || replica_affinity;
+  size_t begin = full ? 0 : shard_pos;
+  size_t end = full ? dataset_size : shard_pos + shard_size;
+  auto keys = uf.keys();
+  auto sizes = uf.sizes();
+  size_hints = (sizes != nullptr);
+  // row of the uuid file of each dataset position
+  auto row = [this](size_t i) {
+    return split_rows.empty() ? i : split_rows[i];
+  };
+  u64_uuids.resize(end - begin);
+  for (size_t i = begin; i != end; ++i) {
+    auto r = row(i);
+    u64_uuids[i - begin] = U64Key{static_cast<int64_t>(keys[2 * r]),
+                                  static_cast<int64_t>(keys[2 * r + 1]),
+                                  size_hints ? sizes[r] : 0};
+  }
+  loaded_pos = begin;
+  if (replica_affinity) {
+    DALI_ENFORCE(uf.affinity() != nullptr,
+                 "replica_affinity requires a uuids_file with affinity");
+    affinity.resize(dataset_size);
+    for (size_t i = 0; i != dataset_size; ++i) {
+      affinity[i] = uf.affinity()[row(i)];
+    }
+  }
+  // indexes are no longer needed
+  std::vector<uint64_t>().swap(split_rows);
 }
 
 }  // namespace crs4
@@ -108,6 +355,21 @@ DALI_SCHEMA(crs4__cassandra)
 .NumOutput(2)
 .AddOptionalArg("source_uuids", R"(Full list of uuids)",
    std::vector<std::string>())
+.AddOptionalArg<std::string>("uuids_file",
+   R"code(Binary file with the full list of uuids, alternative to
+source_uuids. If the file has a sizes column, the sizes are used to
+allocate the batches in advance (with data_decoding=none and ooo=False).)code",
+   "")
+.AddOptionalArg<std::string>("split_file",
+   R"code(Binary split file (see crs4.cassandra_utils.save_split_file),
+alternative to source_uuids and uuids_file: the uuids of the splits
+selected by split_index are read.)code",
+   "")
+.AddOptionalArg("split_index",
+   R"code(Splits of split_file to be read. With more than one index
+(e.g., the training folds of a cross-validation) the splits are merged,
+in the given order.)code",
+   std::vector<int>())
 .AddOptionalArg("num_shards",
    R"code(Partitions the data into the specified number of shards.
 This is typically used for distributed training.)code", 1)
@@ -115,6 +377,16 @@ This is typically used for distributed training.)code", 1)
    R"code(Index of the shard to read.)code", 0)
 .AddOptionalArg("shuffle_every_epoch", R"(Reshuffling uuids at each epoch)",
    false)
+.AddOptionalArg("lazy_shuffle",
+   R"code(With shuffle_every_epoch, shuffle by a seeded permutation of
+the dataset positions, computed batch by batch, instead of shuffling the
+whole list of uuids at each epoch. The order matches the one given by
+crs4.cassandra_utils.permute_index(i, len(uuids), seed + epoch).)code",
+   false)
 .AddOptionalArg("loop_forever", R"(Loop on souce_uuids)", true)
+.AddOptionalArg("replica_affinity",
+   R"code(Assign to each shard the uuids stored on the Cassandra nodes
+close to it, according to the affinity column of uuids_file, while
+keeping the shard sizes equal.)code", false)
 .AddParent("crs4__cassandra_interactive");
 
@@ -20,15 +20,34 @@
 #include <string>
 #include <utility>
 #include <cmath>
+#include <future>
 #include "dali/pipeline/operator/builtin/input_operator.h"
 #include "dali/operators/reader/reader_op.h"
 #include "./cassandra_dali_interactive.h"
 #include "./batch_loader.h"
+#include "./uuid_file.h"
+#include "./permutation.h"
 
 namespace crs4 {
 
 using StrUUIDs = std::vector<std::string>;
-using U64_UUIDs = std::vector<std::pair<int64_t, int64_t>>;
+// uuid as a pair of u64 (as in CassUuid), with the size of its data if
+// known (0 otherwise)
+struct U64Key {
+  int64_t first;
+  int64_t second;
+  uint64_t size = 0;
+};
+using U64_UUIDs = std::vector<U64Key>;
+
+// position of the reader, as saved in DALI checkpoints
+struct SelfFeedState {
+  int epoch = 0;
+  size_t batch = 0;  // batches of epoch already returned
+  int64_t seed = 0;
+  int shard_id = 0;
+  int num_shards = 1;
+};
 
 class CassandraSelfFeed : public CassandraInteractive {
  public:
@@ -36,7 +55,7 @@ class CassandraSelfFeed : public CassandraInteractive {
 
   dali::ReaderMeta GetReaderMeta() const override {
     dali::ReaderMeta ret;
-    ret.epoch_size = source_uuids.size();
+    ret.epoch_size = dataset_size;
     ret.epoch_size_padded = num_shards
       * std::ceil(ret.epoch_size / static_cast<double>(num_shards));
     ret.number_of_shards = num_shards;
@@ -46,47 +65,81 @@ class CassandraSelfFeed : public CassandraInteractive {
     return ret;
   }
 
+  void SaveState(dali::OpCheckpoint &cpt,
+                 dali::AccessOrder order) override;
+  void RestoreState(const dali::OpCheckpoint &cpt) override;
+  std::string SerializeCheckpoint(
+    const dali::OpCheckpoint &cpt) const override;
+  void DeserializeCheckpoint(dali::OpCheckpoint &cpt,
+                             const std::string &data) const override;
+
  protected:
-  bool SetupImpl(std::vector<dali::OutputDesc> &output_desc,
-                 const dali::Workspace &ws) override;
-  void feed_new_epoch() {
-    current_epoch++;
-    if (shuffle_every_epoch) {
-      std::mt19937 g(seed + current_epoch);
-      std::shuffle(u64_uuids.begin(), u64_uuids.end(), g);
-    }
-    feed_epoch();
-    left_batches = batches_per_epoch;
-  }
+  void RunImpl(dali::Workspace &ws) override;
+  void try_read_input(const dali::Workspace &ws) override;
+  void feed_new_epoch();
 
  private:
   void set_shard_sizes() {
-    size_t dataset_size = u64_uuids.size();
     shard_size = std::ceil(dataset_size / static_cast<double>(num_shards));
     batches_per_epoch = std::ceil(shard_size
                                   / static_cast<double>(batch_size));
     pad_shard_size = batches_per_epoch * batch_size;
-    size_t pos_begin = std::floor(shard_id * dataset_size
-                               / static_cast<double>(num_shards));
-    shard_begin = u64_uuids.begin() + pos_begin;
-    shard_end = shard_begin + shard_size;
+    shard_pos = std::floor(shard_id * dataset_size
+                           / static_cast<double>(num_shards));
   }
 
   StrUUIDs source_uuids;
+  std::string uuids_file;
+  // splits of split_file to be read, and rows of the uuid file they
+  // select (only while loading)
+  std::string split_file;
+  std::vector<int> split_index;
+  std::vector<uint64_t> split_rows;
   U64_UUIDs u64_uuids;
+  size_t dataset_size;
+  size_t loaded_pos = 0;  // dataset position of u64_uuids[0]
   int current_epoch = -1;
   const int shard_id;
   const int num_shards;
   bool shuffle_every_epoch;
   bool loop_forever;
+  bool replica_affinity;
+  // shuffle via a seeded permutation, evaluated batch by batch
+  bool lazy_shuffle;
+  FeistelPermutation perm;
+  bool size_hints = false;  // feed data sizes from uuids_file
+  // replica affinity: preferred shard of each uuid and epoch order of
+  // the uuids
+  std::vector<int32_t> affinity;
+  std::vector<size_t> order;
+  // uuids of this shard in current and next epoch, when reshuffling or
+  // using replica affinity
+  U64_UUIDs shard_uuids;
+  U64_UUIDs next_shard_uuids;
+  size_t pool_size;
+  size_t pool_offset;
+  size_t pool_deficit;
   U64_UUIDs::iterator shard_begin;
   U64_UUIDs::iterator shard_end;
+  size_t shard_pos;
   size_t shard_size;
   size_t batches_per_epoch;
   size_t pad_shard_size;
-  size_t left_batches = 0;
+  size_t next_batch = 0;  // next batch of current epoch to be fed
+  int read_epoch = 0;  // epoch of the batches returned to the pipeline
+  size_t read_batch = 0;  // batches of read_epoch already returned
+  dali::TensorList<dali::CPUBackend> tl_batch;  // buffer for fed batches
   void convert_uuids();
-  void feed_epoch();
+  void load_uuids_file(const UuidFile& uf);
+  void select_splits(const UuidFile& uf);
+  void set_replica_pool();
+  void assign_replica_shard();
+  void prepare_epoch(int epoch);
+  void feed_batch();
+  const U64Key& shard_key(size_t i) const;
+  // next epoch is prepared in background, declared last so that it
+  // completes before the buffers are destroyed
+  std::future<void> next_epoch;
 };
 
 }  // namespace crs4
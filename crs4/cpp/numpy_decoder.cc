@@ -13,28 +13,65 @@
 // limitations under the License.
 
 #include <iostream>
+#include <cstring>
 #include "./numpy_decoder.h"
 
 namespace crs4 {
 
 bool NumpyDecoder::SetupImpl(std::vector<dali::OutputDesc> &output_desc,
                              const dali::Workspace &ws) {
-  return false;
-}
-
-void NumpyDecoder::RunImpl(dali::Workspace &ws) {
+  // parse the headers to get output shapes and type
   const auto &input = ws.Input<::dali::CPUBackend>(0);
-  auto &output = ws.Output<::dali::CPUBackend>(0);
   const auto &in_shape = input.shape();
-  bool pinned = output.is_pinned();
-  for (int sample_id = 0; sample_id < in_shape.num_samples(); sample_id++) {
+  int nsamples = in_shape.num_samples();
+  headers.resize(nsamples);
+  dali::TensorListShape<> out_shape;
+  for (int sample_id = 0; sample_id < nsamples; sample_id++) {
     auto in_ptr = input.raw_tensor(sample_id);
     auto sz = in_shape.tensor_size(sample_id);
     auto mis = ::dali::MemInputStream(in_ptr, sz);
-    auto npy_ten = dali::numpy::ReadTensor(&mis, pinned);
-    output.set_type(npy_ten.type());
-    output.CopySample(sample_id, npy_ten);
+    auto &hdr = headers[sample_id];
+    dali::numpy::ParseHeader(hdr, &mis);
+    DALI_ENFORCE(hdr.data_offset + hdr.nbytes() <= static_cast<size_t>(sz),
+                 dali::make_string("Truncated npy data in sample ", sample_id));
+    if (sample_id == 0) {
+      out_shape.resize(nsamples, hdr.shape.sample_dim());
+    }
+    DALI_ENFORCE(hdr.type() == headers[0].type(),
+                 "All the npy samples in a batch must have the same type");
+    DALI_ENFORCE(hdr.shape.sample_dim() == out_shape.sample_dim(),
+                 "All the npy samples in a batch must have the same ndim");
+    out_shape.set_tensor_shape(sample_id, hdr.shape);
+  }
+  output_desc.resize(1);
+  output_desc[0].shape = std::move(out_shape);
+  output_desc[0].type = nsamples > 0 ? headers[0].type()
+                                     : dali::DALIDataType::DALI_UINT8;
+  return true;
+}
+
+void NumpyDecoder::RunImpl(dali::Workspace &ws) {
+  const auto &input = ws.Input<::dali::CPUBackend>(0);
+  auto &output = ws.Output<::dali::CPUBackend>(0);
+  auto &thread_pool = ws.GetThreadPool();
+  int nsamples = input.num_samples();
+  for (int sample_id = 0; sample_id < nsamples; sample_id++) {
+    thread_pool.AddWork([&, sample_id](int thread_id) {
+      // single copy, straight from the input bytes
+      const auto &hdr = headers[sample_id];
+      auto data = static_cast<const uint8_t*>(input.raw_tensor(sample_id))
+        + hdr.data_offset;
+      if (hdr.fortran_order) {
+        dali::ConstSampleView<dali::CPUBackend> in_view(data, hdr.shape,
+                                                        hdr.type());
+        dali::numpy::FromFortranOrder(output[sample_id], in_view);
+      } else {
+        std::memcpy(output.raw_mutable_tensor(sample_id), data,
+                    hdr.nbytes());
+      }
+    }, headers[sample_id].nbytes());
   }
+  thread_pool.RunAll();
 }
 
 }  // namespace crs4
@@ -40,6 +40,8 @@ class NumpyDecoder : public dali::Operator<dali::CPUBackend> {
     return false;
   }
 
+ private:
+  std::vector<dali::numpy::HeaderData> headers;
 };
 
 }  // namespace crs4
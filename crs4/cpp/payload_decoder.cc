@@ -0,0 +1,292 @@
+// Copyright 2022 CRS4 (http://www.crs4.it/)
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <algorithm>
+#include <cstring>
+#include <memory>
+#include <stdexcept>
+#include "dali/util/numpy.h"
+#include "./payload_decoder.h"
+#ifdef CRS4_WITH_LZ4
+#include <lz4.h>
+#endif
+#ifdef CRS4_WITH_TURBOJPEG
+#include <turbojpeg.h>
+#endif
+#ifdef CRS4_WITH_PNG
+#include <png.h>
+#endif
+
+namespace crs4 {
+
+payload_t get_payload_type(const std::string& decoding) {
+  if (decoding == "none") {
+    return payload_raw;
+  } else if (decoding == "npy") {
+    return payload_npy;
+  } else if (decoding == "tensor") {
+    return payload_tensor;
+  } else if (decoding == "image") {
+    return payload_image;
+  }
+  throw std::runtime_error("Unknown decoding: " + decoding
+                           + " (expected none, npy, tensor or image)");
+}
+
+size_t PayloadHeader::nbytes() const {
+  return dali::volume(shape) * dali::TypeTable::GetTypeInfo(type).size();
+}
+
+static void parse_tensor(const uint8_t* data, size_t sz, PayloadHeader& hdr) {
+  if (sz < TENSOR_HEADER_SIZE || data[0] != 'C' || data[1] != 'T') {
+    throw std::runtime_error("Error: blob is not a tensor payload");
+  }
+  auto type = static_cast<dali::DALIDataType>(data[2]);
+  if (dali::TypeTable::TryGetTypeInfo(type) == nullptr) {
+    throw std::runtime_error("Error: unknown type in tensor payload");
+  }
+  int ndim = data[3];
+  uint32_t flags;
+  std::memcpy(&flags, data + 4, sizeof(flags));
+  if ((flags & ~TENSOR_LZ4) != 0) {
+    throw std::runtime_error("Error: unsupported tensor payload flags");
+  }
+#ifndef CRS4_WITH_LZ4
+  if (flags & TENSOR_LZ4) {
+    throw std::runtime_error(
+      "Error: lz4 tensor payload, but plugin built without lz4");
+  }
+#endif
+  size_t off = TENSOR_HEADER_SIZE + ndim * sizeof(uint32_t);
+  if (sz < off) {
+    throw std::runtime_error("Error: truncated tensor payload header");
+  }
+  hdr.type = type;
+  hdr.shape.resize(ndim);
+  for (int d = 0; d < ndim; ++d) {
+    uint32_t ext;
+    std::memcpy(&ext, data + TENSOR_HEADER_SIZE + d * sizeof(ext),
+                sizeof(ext));
+    hdr.shape[d] = ext;
+  }
+  hdr.data_offset = off;
+  hdr.fortran_order = false;
+  hdr.compressed_size = (flags & TENSOR_LZ4) ? sz - off : 0;
+}
+
+static void parse_npy(const uint8_t* data, size_t sz, PayloadHeader& hdr) {
+  dali::numpy::HeaderData npy;
+  auto mis = dali::MemInputStream(data, sz);
+  dali::numpy::ParseHeader(npy, &mis);
+  hdr.type = npy.type();
+  hdr.shape = npy.shape;
+  hdr.data_offset = npy.data_offset;
+  hdr.fortran_order = npy.fortran_order;
+  hdr.compressed_size = 0;
+}
+
+#ifdef CRS4_WITH_TURBOJPEG
+static tjhandle jpeg_handle() {
+  // one decompressor per thread
+  thread_local std::unique_ptr<void, int(*)(tjhandle)> handle(
+    tjInitDecompress(), tjDestroy);
+  if (handle == nullptr) {
+    throw std::runtime_error("Error: unable to init turbojpeg");
+  }
+  return handle.get();
+}
+#endif
+
+static void parse_jpeg(const uint8_t* data, size_t sz, PayloadHeader& hdr,
+                       int min_size) {
+#ifdef CRS4_WITH_TURBOJPEG
+  auto handle = jpeg_handle();
+  int w, h, subsamp, colorspace;
+  if (tjDecompressHeader3(handle, data, sz, &w, &h, &subsamp,
+                          &colorspace) != 0) {
+    throw std::runtime_error("Error decoding JPEG header: "
+                             + std::string(tjGetErrorStr2(handle)));
+  }
+  // smallest scaling (in the DCT domain) keeping the shorter side
+  // >= min_size
+  int sw = w, sh = h;
+  if (min_size > 0) {
+    int nsf;
+    tjscalingfactor* sf = tjGetScalingFactors(&nsf);
+    for (int i = 0; i < nsf; ++i) {
+      int cw = TJSCALED(w, sf[i]);
+      int ch = TJSCALED(h, sf[i]);
+      if (std::min(cw, ch) >= min_size && cw * ch < sw * sh) {
+        sw = cw;
+        sh = ch;
+      }
+    }
+  }
+  hdr.shape = {sh, sw, 3};
+#else
+  throw std::runtime_error(
+    "Error: JPEG payload, but plugin built without libturbojpeg");
+#endif
+}
+
+static void parse_png(const uint8_t* data, size_t sz, PayloadHeader& hdr) {
+#ifdef CRS4_WITH_PNG
+  // signature (8 bytes) followed by IHDR chunk with width and height
+  if (sz < 24 || std::memcmp(data + 12, "IHDR", 4) != 0) {
+    throw std::runtime_error("Error: invalid PNG header");
+  }
+  auto be32 = [](const uint8_t* p) -> int64_t {
+    return (int64_t(p[0]) << 24) | (p[1] << 16) | (p[2] << 8) | p[3];
+  };
+  hdr.shape = {be32(data + 20), be32(data + 16), 3};
+#else
+  throw std::runtime_error(
+    "Error: PNG payload, but plugin built without libpng");
+#endif
+}
+
+static void parse_image(const uint8_t* data, size_t sz, PayloadHeader& hdr,
+                        int min_size) {
+  static const uint8_t png_sig[] = {0x89, 'P', 'N', 'G', '\r', '\n', 0x1a,
+                                    '\n'};
+  if (sz >= 3 && data[0] == 0xff && data[1] == 0xd8 && data[2] == 0xff) {
+    hdr.image = img_jpeg;
+    parse_jpeg(data, sz, hdr, min_size);
+  } else if (sz >= 8 && std::memcmp(data, png_sig, 8) == 0) {
+    hdr.image = img_png;
+    parse_png(data, sz, hdr);
+  } else {
+    throw std::runtime_error("Error: image payload is neither JPEG nor PNG");
+  }
+  hdr.type = dali::DALIDataType::DALI_UINT8;
+  hdr.data_offset = 0;
+  hdr.fortran_order = false;
+  hdr.compressed_size = sz;
+}
+
+void decode_image(const PayloadHeader& hdr, const uint8_t* data,
+                  uint8_t* out) {
+  switch (hdr.image) {
+#ifdef CRS4_WITH_TURBOJPEG
+  case img_jpeg: {
+    auto handle = jpeg_handle();
+    // turbojpeg chooses the scaling factor matching the output size
+    if (tjDecompress2(handle, data, hdr.compressed_size, out, hdr.shape[1],
+                      0, hdr.shape[0], TJPF_RGB, TJFLAG_FASTDCT) != 0) {
+      throw std::runtime_error("Error decoding JPEG: "
+                               + std::string(tjGetErrorStr2(handle)));
+    }
+    break;
+  }
+#endif
+#ifdef CRS4_WITH_PNG
+  case img_png: {
+    png_image image;
+    std::memset(&image, 0, sizeof(image));
+    image.version = PNG_IMAGE_VERSION;
+    if (png_image_begin_read_from_memory(&image, data,
+                                         hdr.compressed_size) == 0) {
+      throw std::runtime_error("Error decoding PNG: "
+                               + std::string(image.message));
+    }
+    image.format = PNG_FORMAT_RGB;
+    if (png_image_finish_read(&image, nullptr, out, 0, nullptr) == 0) {
+      png_image_free(&image);
+      throw std::runtime_error("Error decoding PNG: "
+                               + std::string(image.message));
+    }
+    break;
+  }
+#endif
+  default:
+    throw std::runtime_error("Unknown image format");
+  }
+}
+
+void parse_payload(payload_t pt, const uint8_t* data, size_t sz,
+                   PayloadHeader& hdr, int min_size) {
+  hdr.image = img_none;
+  switch (pt) {
+  case payload_raw:
+    hdr.type = dali::DALIDataType::DALI_UINT8;
+    hdr.shape = dali::TensorShape<>(static_cast<int64_t>(sz));
+    hdr.data_offset = 0;
+    hdr.fortran_order = false;
+    hdr.compressed_size = 0;
+    return;
+  case payload_npy:
+    parse_npy(data, sz, hdr);
+    break;
+  case payload_tensor:
+    parse_tensor(data, sz, hdr);
+    break;
+  case payload_image:
+    parse_image(data, sz, hdr, min_size);
+    return;
+  default:
+    throw std::runtime_error("Unknown payload type");
+  }
+  if (hdr.compressed_size == 0 && hdr.data_offset + hdr.nbytes() > sz) {
+    throw std::runtime_error("Error: truncated payload");
+  }
+}
+
+void copy_payload(const PayloadHeader& hdr, const uint8_t* data,
+                  dali::SampleView<dali::CPUBackend> out) {
+  if (hdr.image != img_none) {
+    decode_image(hdr, data, static_cast<uint8_t*>(out.raw_mutable_data()));
+    return;
+  }
+  data += hdr.data_offset;
+#ifdef CRS4_WITH_LZ4
+  if (hdr.compressed_size > 0) {
+    // decompress straight into the output
+    int n = LZ4_decompress_safe(reinterpret_cast<const char*>(data),
+                                static_cast<char*>(out.raw_mutable_data()),
+                                hdr.compressed_size, hdr.nbytes());
+    if (n < 0 || static_cast<size_t>(n) != hdr.nbytes()) {
+      throw std::runtime_error("Error: corrupted lz4 tensor payload");
+    }
+    return;
+  }
+#endif
+  if (hdr.fortran_order) {
+    dali::ConstSampleView<dali::CPUBackend> in(data, hdr.shape, hdr.type);
+    dali::numpy::FromFortranOrder(out, in);
+  } else {
+    std::memcpy(out.raw_mutable_data(), data, hdr.nbytes());
+  }
+}
+
+dali::TensorListShape<> payload_shapes(const std::vector<PayloadHeader>& hdrs,
+                                       dali::DALIDataType* type) {
+  dali::TensorListShape<> ts;
+  if (hdrs.empty()) {
+    *type = dali::DALIDataType::DALI_UINT8;
+    return ts;
+  }
+  *type = hdrs[0].type;
+  int ndim = hdrs[0].shape.sample_dim();
+  ts.resize(hdrs.size(), ndim);
+  for (size_t i = 0; i != hdrs.size(); ++i) {
+    if (hdrs[i].type != *type || hdrs[i].shape.sample_dim() != ndim) {
+      throw std::runtime_error(
+        "Error: all the tensors in a batch must have same type and ndim");
+    }
+    ts.set_tensor_shape(i, hdrs[i].shape);
+  }
+  return ts;
+}
+
+}  // namespace crs4
@@ -0,0 +1,79 @@
+// Copyright 2022 CRS4 (http://www.crs4.it/)
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef CRS4_CPP_PAYLOAD_DECODER_H_
+#define CRS4_CPP_PAYLOAD_DECODER_H_
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "dali/pipeline/data/tensor_list.h"
+
+namespace crs4 {
+
+// Payloads of blob columns:
+//
+//   raw: bytes, returned as 1D uint8 tensors
+//   npy: NumPy .npy files
+//   tensor: compact header, as written by
+//     crs4.cassandra_utils.encode_tensor (all values are little-endian):
+//
+//     magic "CT" | u8 dtype (DALIDataType) | u8 ndim | u32 flags
+//     shape: ndim x u32
+//     data, C order (lz4 block, without size, if flags & TENSOR_LZ4)
+//
+//     e.g., images pre-decoded as HWC uint8, ready for augmentation
+//
+//   image: JPEG or PNG files, decoded to HWC uint8 RGB (requires
+//     libturbojpeg and libpng). JPEGs can be downscaled while decoding,
+//     in the DCT domain, down to a minimum size.
+//
+// Typed payloads are decoded by the copy threads straight into the
+// output batch, with a single copy.
+
+enum payload_t {payload_raw, payload_npy, payload_tensor, payload_image};
+enum image_fmt {img_none, img_jpeg, img_png};
+
+const uint32_t TENSOR_HEADER_SIZE = 8;
+const uint32_t TENSOR_LZ4 = 1;
+
+payload_t get_payload_type(const std::string& decoding);
+
+struct PayloadHeader {
+  dali::DALIDataType type = dali::DALIDataType::DALI_UINT8;
+  dali::TensorShape<> shape;
+  size_t data_offset = 0;
+  bool fortran_order = false;
+  // size of lz4 or image payload, 0 if not compressed
+  size_t compressed_size = 0;
+  image_fmt image = img_none;
+  size_t nbytes() const;
+};
+
+// min_size: for images, minimum size of the shorter side when
+// downscaling (0: no downscaling)
+void parse_payload(payload_t pt, const uint8_t* data, size_t sz,
+                   PayloadHeader& hdr, int min_size = 0);
+void copy_payload(const PayloadHeader& hdr, const uint8_t* data,
+                  dali::SampleView<dali::CPUBackend> out);
+// decode JPEG/PNG payload to hdr.shape HWC RGB pixels
+void decode_image(const PayloadHeader& hdr, const uint8_t* data,
+                  uint8_t* out);
+// shapes of a batch, enforcing same type and ndim
+dali::TensorListShape<> payload_shapes(const std::vector<PayloadHeader>& hdrs,
+                                       dali::DALIDataType* type);
+
+}  // namespace crs4
+
+#endif  // CRS4_CPP_PAYLOAD_DECODER_H_
@@ -0,0 +1,77 @@
+// Copyright 2022 CRS4 (http://www.crs4.it/)
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef CRS4_CPP_PERMUTATION_H_
+#define CRS4_CPP_PERMUTATION_H_
+
+#include <cstdint>
+
+namespace crs4 {
+
+// Seeded permutation of [0, n), evaluated one index at a time: a
+// Feistel network over the smallest power of 4 not below n, restricted
+// to [0, n) by cycle walking (on average less than 4 rounds of the
+// network per index). Must match
+// crs4.cassandra_utils._permutation.permute_index.
+class FeistelPermutation {
+ public:
+  FeistelPermutation(uint64_t n = 1, uint64_t seed = 0) : n(n) {
+    half = 1;
+    while (half < 32 && (uint64_t(1) << (2 * half)) < n) {
+      ++half;
+    }
+    mask = (uint64_t(1) << half) - 1;
+    for (int r = 0; r != ROUNDS; ++r) {
+      keys[r] = mix(seed ^ ((r + 1) * GOLDEN));
+    }
+  }
+
+  // position in the permutation of the i-th element
+  uint64_t operator()(uint64_t i) const {
+    do {
+      i = encrypt(i);
+    } while (i >= n);
+    return i;
+  }
+
+ private:
+  static const int ROUNDS = 6;
+  static const uint64_t GOLDEN = 0x9E3779B97F4A7C15ULL;
+  uint64_t n;
+  int half;
+  uint64_t mask;
+  uint64_t keys[ROUNDS];
+
+  // splitmix64 finalizer
+  static uint64_t mix(uint64_t x) {
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+    return x ^ (x >> 31);
+  }
+
+  uint64_t encrypt(uint64_t x) const {
+    uint64_t left = x >> half;
+    uint64_t right = x & mask;
+    for (int r = 0; r != ROUNDS; ++r) {
+      uint64_t t = right;
+      right = left ^ (mix(right ^ keys[r]) & mask);
+      left = t;
+    }
+    return (left << half) | right;
+  }
+};
+
+}  // namespace crs4
+
+#endif  // CRS4_CPP_PERMUTATION_H_
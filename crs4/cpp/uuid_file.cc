@@ -0,0 +1,137 @@
+// Copyright 2022 CRS4 (http://www.crs4.it/)
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <cstring>
+#include <stdexcept>
+#include "./uuid_file.h"
+
+namespace crs4 {
+
+namespace {
+const char UUID_FILE_MAGIC[8] = {'C', 'R', 'S', '4', 'U', 'U', 'I', 'D'};
+const size_t UUID_FILE_HEADER = 32;
+
+template <typename T>
+T read_le(const char* ptr) {
+  T val;
+  std::memcpy(&val, ptr, sizeof(T));  // assuming a little-endian host
+  return val;
+}
+}  // namespace
+
+UuidFile::UuidFile(const std::string& path) : path(path) {
+  int fd = open(path.c_str(), O_RDONLY);
+  if (fd < 0) {
+    throw std::runtime_error("Error opening uuid file " + path);
+  }
+  struct stat st;
+  if (fstat(fd, &st) != 0) {
+    close(fd);
+    throw std::runtime_error("Error reading size of uuid file " + path);
+  }
+  length = st.st_size;
+  if (length < UUID_FILE_HEADER) {
+    close(fd);
+    throw std::runtime_error("Invalid uuid file (too short): " + path);
+  }
+  addr = mmap(nullptr, length, PROT_READ, MAP_SHARED, fd, 0);
+  close(fd);
+  if (addr == MAP_FAILED) {
+    addr = nullptr;
+    throw std::runtime_error("Error mapping uuid file " + path);
+  }
+  try {
+    parse();
+  } catch (...) {
+    munmap(addr, length);
+    throw;
+  }
+}
+
+void UuidFile::parse() {
+  // parse header
+  const char* base = static_cast<const char*>(addr);
+  if (std::memcmp(base, UUID_FILE_MAGIC, sizeof(UUID_FILE_MAGIC)) != 0) {
+    throw std::runtime_error("Invalid uuid file (bad magic): " + path);
+  }
+  auto version = read_le<uint32_t>(base + 8);
+  if (version != UUID_FILE_VERSION) {
+    throw std::runtime_error("Unsupported uuid file version "
+                             + std::to_string(version) + ": " + path);
+  }
+  auto flags = read_le<uint32_t>(base + 12);
+  count = read_le<uint64_t>(base + 16);
+  auto meta_len = read_le<uint64_t>(base + 24);
+  // locate columns
+  size_t off = UUID_FILE_HEADER + ((meta_len + 7) / 8) * 8;
+  check_length(off + 2 * sizeof(uint64_t) * count);
+  keys_ptr = reinterpret_cast<const uint64_t*>(base + off);
+  off += 2 * sizeof(uint64_t) * count;
+  if (flags & UUID_FILE_SIZES) {
+    check_length(off + sizeof(uint64_t) * count);
+    sizes_ptr = reinterpret_cast<const uint64_t*>(base + off);
+    off += sizeof(uint64_t) * count;
+  }
+  if (flags & UUID_FILE_LABELS) {
+    check_length(off + sizeof(int32_t) * count);
+    labels_ptr = reinterpret_cast<const int32_t*>(base + off);
+    off += sizeof(int32_t) * count;
+  }
+  if (flags & UUID_FILE_AFFINITY) {
+    check_length(off + sizeof(int32_t) * count);
+    affinity_ptr = reinterpret_cast<const int32_t*>(base + off);
+    off += sizeof(int32_t) * count;
+  }
+  if (flags & UUID_FILE_CHECKSUMS) {
+    check_length(off + sizeof(int32_t) * count);
+    checksums_ptr = reinterpret_cast<const int32_t*>(base + off);
+    off += sizeof(int32_t) * count;
+  }
+  if (flags & UUID_FILE_SPLITS) {
+    off = ((off + 7) / 8) * 8;
+    check_length(off + sizeof(uint64_t));
+    auto num_splits = read_le<uint64_t>(base + off);
+    off += sizeof(uint64_t);
+    check_length(off + sizeof(uint64_t) * num_splits);
+    split_sizes.resize(num_splits);
+    for (size_t i = 0; i != num_splits; ++i) {
+      split_sizes[i] = read_le<uint64_t>(base + off);
+      off += sizeof(uint64_t);
+    }
+    split_ptrs.resize(num_splits);
+    for (size_t i = 0; i != num_splits; ++i) {
+      check_length(off + sizeof(uint64_t) * split_sizes[i]);
+      split_ptrs[i] = reinterpret_cast<const uint64_t*>(base + off);
+      off += sizeof(uint64_t) * split_sizes[i];
+    }
+  }
+}
+
+UuidFile::~UuidFile() {
+  if (addr != nullptr) {
+    munmap(addr, length);
+  }
+}
+
+void UuidFile::check_length(size_t end) const {
+  if (end > length) {
+    throw std::runtime_error("Invalid uuid file (truncated): " + path);
+  }
+}
+
+}  // namespace crs4
@@ -0,0 +1,104 @@
+// Copyright 2022 CRS4 (http://www.crs4.it/)
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#ifndef CRS4_CPP_UUID_FILE_H_
+#define CRS4_CPP_UUID_FILE_H_
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace crs4 {
+
+// Binary uuid file, as written by crs4.cassandra_utils.save_uuids_file
+// (all values are little-endian):
+//
+//   magic "CRS4UUID" | u32 version | u32 flags | u64 count | u64 meta_len
+//   metadata (JSON, meta_len bytes, zero-padded to a multiple of 8)
+//   keys: count x (u64 time_and_version, u64 clock_seq_and_node)
+//   sizes: count x u64  (if flags & UUID_FILE_SIZES)
+//   labels: count x i32 (if flags & UUID_FILE_LABELS)
+//   affinity: count x i32 (if flags & UUID_FILE_AFFINITY)
+//   checksums: count x i32 (if flags & UUID_FILE_CHECKSUMS)
+//   splits (if flags & UUID_FILE_SPLITS), aligned to 8 bytes:
+//     u64 num_splits | num_splits x u64 length | indexes of the uuids,
+//     as u64, of all the splits, one after the other
+//
+// The file is memory-mapped, so that only the needed pages are read.
+
+const uint32_t UUID_FILE_VERSION = 1;
+const uint32_t UUID_FILE_SIZES = 1;
+const uint32_t UUID_FILE_LABELS = 2;
+const uint32_t UUID_FILE_AFFINITY = 4;
+const uint32_t UUID_FILE_CHECKSUMS = 8;
+const uint32_t UUID_FILE_SPLITS = 16;
+
+class UuidFile {
+ private:
+  std::string path;
+  void* addr = nullptr;
+  size_t length = 0;
+  uint64_t count = 0;
+  const uint64_t* keys_ptr = nullptr;
+  const uint64_t* sizes_ptr = nullptr;
+  const int32_t* labels_ptr = nullptr;
+  const int32_t* affinity_ptr = nullptr;
+  const int32_t* checksums_ptr = nullptr;
+  std::vector<const uint64_t*> split_ptrs;
+  std::vector<uint64_t> split_sizes;
+  void parse();
+  void check_length(size_t end) const;
+
+ public:
+  explicit UuidFile(const std::string& path);
+  ~UuidFile();
+  UuidFile(const UuidFile&) = delete;
+  UuidFile& operator=(const UuidFile&) = delete;
+  size_t size() const {
+    return count;
+  }
+  // uuids as pairs of u64, i.e., the CassUuid layout
+  const uint64_t* keys() const {
+    return keys_ptr;
+  }
+  // optional columns, nullptr if not available
+  const uint64_t* sizes() const {
+    return sizes_ptr;
+  }
+  const int32_t* labels() const {
+    return labels_ptr;
+  }
+  // preferred shard of each uuid (-1 if none), see replica_affinity
+  const int32_t* affinity() const {
+    return affinity_ptr;
+  }
+  // crc32 of the data, as signed int
+  const int32_t* checksums() const {
+    return checksums_ptr;
+  }
+  // splits, as arrays of indexes of the uuids (none if not available)
+  size_t num_splits() const {
+    return split_ptrs.size();
+  }
+  const uint64_t* split(size_t i) const {
+    return split_ptrs.at(i);
+  }
+  size_t split_size(size_t i) const {
+    return split_sizes.at(i);
+  }
+};
+
+}  // namespace crs4
+
+#endif  // CRS4_CPP_UUID_FILE_H_
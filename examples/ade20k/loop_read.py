@@ -13,7 +13,7 @@
 # limitations under the License.
 
 # cassandra reader
-from cassandra_reader import get_cassandra_reader, read_uuids
+from cassandra_reader import get_cassandra_reader
 
 # dali
 from nvidia.dali.pipeline import pipeline_def
@@ -70,9 +70,6 @@ def read_data(
 
     bs = 128
     if reader == "cassandra":
-        source_uuids = read_uuids(
-            rows_fn,
-        )
         db_reader = get_cassandra_reader(
             data_table=data_table,
             prefetch_buffers=16,
@@ -83,7 +80,7 @@ def read_data(
             # copy_threads=4,
             # ooo=True,
             slow_start=4,
-            source_uuids=source_uuids,
+            uuids_file=rows_fn,
             shard_id=global_rank,
             num_shards=world_size,
         )
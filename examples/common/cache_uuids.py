@@ -23,12 +23,16 @@ def cache_uuids(
     metadata_table,
     rows_fn,
     id_col="id",
+    size_col=None,
+    checksum_col=None,
 ):
-    """Cache uuids from DB to local file (via pickle)
+    """Cache uuids from DB to local binary file
 
     :param metadata_table: Cassandra metadata table (i.e., keyspace.name_of_the_metadata_table)
-    :param rows_fn: Filename of local copy of UUIDs
+    :param rows_fn: Filename of local binary copy of UUIDs (and of sizes and checksums), to be used as uuids_file by the reader
     :param id_col: Column containing the UUIDs
+    :param size_col: Optional column with data sizes (saved as hints for the reader)
+    :param checksum_col: Optional column with data checksums
     """
 
     # Load list of uuids from Cassandra DB...
@@ -38,14 +42,16 @@ def cache_uuids(
     conf = {
         "table": metadata_table,
         "id_col": id_col,
+        "size_col": size_col,
+        "checksum_col": checksum_col,
     }
     lm.set_config(conf)
-    print("Loading list of uuids from DB... ", end="", flush=True)
-    lm.read_rows_from_db()
+    print("Loading list of uuids from DB...")
+    lm.read_rows_from_db(progress=True)
     stuff = lm.get_rows()
     uuids = stuff["row_keys"]
     real_sz = len(uuids)
-    print(f" {real_sz} images")
+    print(f"{real_sz} images")
     lm.save_rows(rows_fn)
     print(f"Saved as {rows_fn}.")
 
@@ -14,13 +14,13 @@
 
 # load cassandra-dali-plugin
 import crs4.cassandra_utils
+from crs4.cassandra_utils import load_uuids_file
 import nvidia.dali.plugin_manager as plugin_manager
 import nvidia.dali.fn as fn
 import pathlib
 
 # varia
 import os
-import pickle
 
 plugin_path = pathlib.Path(crs4.cassandra_utils.__path__[0])
 plugin_path = plugin_path.parent.parent.joinpath("libcrs4cassandra.so")
@@ -30,10 +30,8 @@ plugin_manager.load_library(plugin_path)
 
 def read_uuids(rows_fn):
     print("Loading list of uuids from cached file... ", end="", flush=True)
-    with open(rows_fn, "rb") as f:
-        stuff = pickle.load(f)
-    # init and return Cassandra reader
-    uuids = stuff["row_keys"]
+    # memory-mapped (N, 2) uint64 array of keys
+    uuids = load_uuids_file(rows_fn)["keys"]
     real_sz = len(uuids)
     print(f" {real_sz} images")
     return uuids
@@ -57,7 +55,13 @@ def get_cassandra_reader(
     ooo=False,
     slow_start=0,
     source_uuids=None,
+    uuids_file=None,
+    split_file=None,
+    split_index=None,
     loop_forever=True,
+    replica_affinity=False,
+    data_decoding="none",
+    label_decoding="none",
 ):
     # Read Cassandra parameters
     from private_data import cass_conf as CC
@@ -94,7 +98,13 @@ def get_cassandra_reader(
         ooo=ooo,
         slow_start=slow_start,
         source_uuids=source_uuids,
+        uuids_file=uuids_file,
+        split_file=split_file,
+        split_index=split_index,
         loop_forever=loop_forever,
+        replica_affinity=replica_affinity,
+        data_decoding=data_decoding,
+        label_decoding=label_decoding,
         shuffle_every_epoch=shuffle_every_epoch,
     )
     return cassandra_reader
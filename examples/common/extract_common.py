@@ -14,7 +14,12 @@
 
 from PIL import Image
 from cassandra.auth import PlainTextAuthProvider
-from crs4.cassandra_utils import CassandraClassificationWriter
+from crs4.cassandra_utils import (
+    CassandraClassificationWriter,
+    IngestManifest,
+    encode_tensor,
+    path_uuid,
+)
 from tqdm import tqdm
 import io
 import numpy as np
@@ -30,6 +35,8 @@ def get_data(img_format="UNCHANGED", img_size=def_size, crop=False):
     # - JPEG: compressed JPEG
     # - PNG: compressed PNG
     # - TIFF: non-compressed TIFF
+    # - RAW: pre-decoded HWC uint8 tensor (read with data_decoding="tensor")
+    # - RAW_LZ4: same as RAW, lz4-compressed
     def r(path):
         if img_format == "UNCHANGED":
             # just return the unchanged raw file
@@ -49,6 +56,11 @@ def get_data(img_format="UNCHANGED", img_size=def_size, crop=False):
                 else:
                     box = [0, off, img_size, off + img_size]
                 img = img.crop(box)
+            if img_format in ("RAW", "RAW_LZ4"):
+                # no need to encode, just add a shape header
+                return encode_tensor(
+                    np.asarray(img), compress=(img_format == "RAW_LZ4")
+                )
             # save to stream
             out_stream = io.BytesIO()
             img.save(out_stream, format=img_format)
@@ -89,8 +101,15 @@ def send_images_to_db(
     data_table,
     metadata_table,
     img_size=def_size,
+    max_inflight=0,
+    manifest=None,
+    size_col=None,
+    checksum_col=None,
 ):
     def ret(jobs):
+        if manifest:
+            # skip the images already written by a previous run
+            jobs = IngestManifest(manifest).pending(jobs, lambda j: path_uuid(j[0]))
         cw = CassandraClassificationWriter(
             cass_conf=cass_conf,
             data_table=data_table,
@@ -100,6 +119,11 @@ def send_images_to_db(
             data_col="data",
             cols=["or_split", "or_label"],
             get_data=get_data(img_format, img_size=img_size),
+            max_inflight=max_inflight,
+            deterministic_ids=bool(manifest),
+            manifest=manifest,
+            size_col=size_col,
+            checksum_col=checksum_col,
         )
         for path, label, partition_items in tqdm(jobs):
             cw.enqueue_image(path, label, partition_items)
@@ -108,6 +132,47 @@ def send_images_to_db(
     return ret
 
 
+def get_item(img_format, img_size=def_size, deterministic_ids=False):
+    # map a job to an item for the writer (to run in worker processes)
+    gd = get_data(img_format, img_size=img_size)
+
+    def r(job):
+        path, label, partition_items = job
+        image_id = path_uuid(path) if deterministic_ids else uuid.uuid4()
+        return (image_id, label, gd(path), partition_items)
+
+    return r
+
+
+def get_writer(
+    cass_conf,
+    data_table,
+    metadata_table,
+    max_inflight=0,
+    manifest=None,
+    size_col=None,
+    checksum_col=None,
+):
+    # create a writer (to run in writer processes)
+    def r():
+        return CassandraClassificationWriter(
+            cass_conf=cass_conf,
+            data_table=data_table,
+            metadata_table=metadata_table,
+            data_id_col="id",
+            data_label_col="label",
+            data_col="data",
+            cols=["or_split", "or_label"],
+            get_data=None,
+            max_inflight=max_inflight,
+            manifest=manifest,
+            size_col=size_col,
+            checksum_col=checksum_col,
+        )
+
+    return r
+
+
 def save_image_to_dir(target_dir, path, label, raw_data, file_ext):
     out_dir = os.path.join(target_dir, str(label))
     if not os.path.exists(out_dir):
@@ -126,8 +191,10 @@ def save_images_to_dir(target_dir, img_format, img_size=def_size):
         file_ext = ".tiff"
     elif img_format == "UNCHANGED":
         file_ext = ".jpg"
+    elif img_format in ("RAW", "RAW_LZ4"):
+        file_ext = ".tensor"
     else:
-        raise ("Supporting only JPEG, PNG, TIFF, and UNCHANGED")
+        raise ("Supporting only JPEG, PNG, TIFF, RAW, RAW_LZ4 and UNCHANGED")
 
     def ret(jobs):
         for path, label, _ in tqdm(jobs):
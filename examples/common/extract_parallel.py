@@ -0,0 +1,79 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import extract_common
+from crs4.cassandra_utils import IngestManifest, ingest, path_uuid
+from clize import run
+
+
+def save_images(
+    src_dir,
+    *,
+    img_format="UNCHANGED",
+    data_table="imagenette.data_train",
+    metadata_table="imagenette.metadata_train",
+    split_subdir="train",
+    img_size=256,
+    num_procs: int = None,
+    num_writers=1,
+    max_inflight=64,
+    manifest=None,
+    size_col=None,
+    checksum_col=None,
+):
+    """Save resized images to Cassandra DB, using multiple processes
+
+    :param src_dir: Input directory for Imagenette
+    :param img_format: Format of output images
+    :param data_table: Name of data table data in the format keyspace.tablename
+    :param metadata_table: Name of data table data in the format keyspace.tablename
+    :param split_subdir: Subdir to be processed
+    :param img_size: Target image size
+    :param num_procs: Number of processes reading and encoding images (default: number of CPUs)
+    :param num_writers: Number of processes writing to the DB
+    :param max_inflight: Max number of concurrent asynchronous inserts per writer
+    :param manifest: File recording the images written, to resume an interrupted run
+    :param size_col: Optional metadata column for data sizes (e.g., size)
+    :param checksum_col: Optional metadata column for data crc32 checksums (e.g., crc32)
+    """
+    # Read Cassandra parameters
+    from private_data import cass_conf
+
+    splits = [split_subdir]
+    jobs = extract_common.get_jobs(src_dir, splits)
+    if manifest:
+        # skip the images already written by a previous run
+        jobs = IngestManifest(manifest).pending(jobs, lambda j: path_uuid(j[0]))
+    ingest(
+        jobs,
+        get_item=extract_common.get_item(
+            img_format, img_size=img_size, deterministic_ids=bool(manifest)
+        ),
+        make_writer=extract_common.get_writer(
+            cass_conf,
+            data_table,
+            metadata_table,
+            max_inflight=max_inflight,
+            manifest=manifest,
+            size_col=size_col,
+            checksum_col=checksum_col,
+        ),
+        num_procs=num_procs,
+        num_writers=num_writers,
+    )
+
+
+# parse arguments
+if __name__ == "__main__":
+    run(save_images)
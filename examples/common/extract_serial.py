@@ -25,6 +25,10 @@ def save_images(
     split_subdir="train",
     target_dir=None,
     img_size=256,
+    max_inflight=0,
+    manifest=None,
+    size_col=None,
+    checksum_col=None,
 ):
     """Save resized images to Cassandra DB or directory
 
@@ -35,6 +39,10 @@ def save_images(
     :param target_dir: Output directory (when saving to filesystem)
     :param split_subdir: Subdir to be processed
     :param img_size: Target image size
+    :param max_inflight: Max number of concurrent asynchronous inserts (0: synchronous batches)
+    :param manifest: File recording the images written, to resume an interrupted run
+    :param size_col: Optional metadata column for data sizes (e.g., size)
+    :param checksum_col: Optional metadata column for data crc32 checksums (e.g., crc32)
     """
     splits = [split_subdir]
     jobs = extract_common.get_jobs(src_dir, splits)
@@ -48,6 +56,10 @@ def save_images(
             data_table=data_table,
             metadata_table=metadata_table,
             img_size=img_size,
+            max_inflight=max_inflight,
+            manifest=manifest,
+            size_col=size_col,
+            checksum_col=checksum_col,
         )(jobs)
     else:
         extract_common.save_images_to_dir(
@@ -13,13 +13,12 @@
 # limitations under the License.
 
 # cassandra reader
-from cassandra_reader import get_cassandra_reader, read_uuids
+from cassandra_reader import get_cassandra_reader
 
 # dali
 from nvidia.dali.pipeline import pipeline_def
 from nvidia.dali.plugin.base_iterator import LastBatchPolicy
 from nvidia.dali.plugin.pytorch import DALIGenericIterator
-import nvidia.dali.fn as fn
 import nvidia.dali.types as types
 
 # some preconfigured operators
@@ -64,18 +63,18 @@ def read_data(
         device_id = types.CPU_ONLY_DEVICE_ID
 
     bs = 128
-    source_uuids = read_uuids(rows_fn)
     db_reader = get_cassandra_reader(
         data_table=data_table,
         prefetch_buffers=16,
         io_threads=8,
         label_type="blob",
+        label_decoding="npy",
         name="Reader",
         # comm_threads=4,
         # copy_threads=4,
         # ooo=True,
         slow_start=4,
-        source_uuids=source_uuids,
+        uuids_file=rows_fn,
         shard_id=global_rank,
         num_shards=world_size,
     )
@@ -94,8 +93,7 @@ def read_data(
         # decode and resize images
         images = fn_decode(images)
         images = fn_resize(images)
-        # decode labels
-        labels = fn.crs4.numpy_decoder(labels)
+        # labels are already decoded by the reader (label_decoding="npy")
         if device_id != types.CPU_ONLY_DEVICE_ID:
             images = images.gpu()
             labels = labels.gpu()
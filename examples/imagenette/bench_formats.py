@@ -0,0 +1,75 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import extract_common
+from crs4.cassandra_utils import decode_tensor
+from clize import run
+from PIL import Image
+import io
+import numpy as np
+import random
+import time
+
+
+def get_decoder(img_format):
+    if img_format in ("RAW", "RAW_LZ4"):
+        return decode_tensor
+
+    def r(data):
+        return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+    return r
+
+
+def bench_formats(
+    src_dir,
+    *,
+    split_subdir="train",
+    img_size=256,
+    num_images=500,
+    formats="UNCHANGED,JPEG,PNG,TIFF,RAW,RAW_LZ4",
+    seed=0,
+):
+    """Compare stored size and CPU decoding speed of the image formats
+
+    :param src_dir: Input directory for Imagenette
+    :param split_subdir: Subdir to be processed
+    :param img_size: Target image size
+    :param num_images: Number of (randomly chosen) images to test
+    :param formats: Comma-separated list of formats, as in extract_serial.py
+    :param seed: Seed for choosing the images
+    """
+    jobs = extract_common.get_jobs(src_dir, [split_subdir])
+    random.Random(seed).shuffle(jobs)
+    paths = [path for path, _, _ in jobs[:num_images]]
+    print(f"{'format':>10} {'KB/image':>10} {'MB/s read':>10} {'decode/s':>10}")
+    for img_format in formats.split(","):
+        blobs = list(map(extract_common.get_data(img_format, img_size), paths))
+        decode = get_decoder(img_format)
+        start = time.perf_counter()
+        for blob in blobs:
+            decode(blob)
+        elapsed = time.perf_counter() - start
+        nbytes = sum(map(len, blobs))
+        # MB/s of stored data needed to keep up with the decoding
+        print(
+            f"{img_format:>10} {nbytes / len(blobs) / 1024:>10.1f}"
+            f" {nbytes / elapsed / 2**20:>10.1f} {len(blobs) / elapsed:>10.1f}"
+        )
+
+
+# parse arguments
+if __name__ == "__main__":
+    run(bench_formats)
@@ -3,7 +3,7 @@
 # (Apache License, Version 2.0)
 
 # cassandra reader
-from cassandra_reader import get_cassandra_reader, read_uuids
+from cassandra_reader import get_cassandra_reader
 
 import argparse
 import os
@@ -197,7 +197,7 @@ def create_dali_pipeline(
     data_table,
     crop,
     size,
-    source_uuids,
+    uuids_file,
     dali_cpu=False,
     is_training=True,
     prefetch_buffers=8,
@@ -213,7 +213,7 @@ def create_dali_pipeline(
         prefetch_buffers=prefetch_buffers,
         shard_id=shard_id,
         num_shards=num_shards,
-        source_uuids=source_uuids,
+        uuids_file=uuids_file,
         io_threads=io_threads,
         comm_threads=comm_threads,
         copy_threads=copy_threads,
@@ -417,14 +417,13 @@ def main():
         val_size = 256
 
     # train pipe
-    train_uuids = read_uuids(rows_fn=args.train_rows_fn)
     pipe = create_dali_pipeline(
         data_table=args.train_data_table,
         batch_size=args.batch_size,
         num_threads=args.workers,
         shard_id=global_rank,
         num_shards=world_size,
-        source_uuids=train_uuids,
+        uuids_file=args.train_rows_fn,
         device_id=local_rank,
         seed=1234,
         crop=crop_size,
@@ -439,14 +438,13 @@ def main():
     )
 
     # val pipe
-    val_uuids = read_uuids(rows_fn=args.val_rows_fn)
     pipe = create_dali_pipeline(
         data_table=args.val_data_table,
         batch_size=args.batch_size,
         num_threads=args.workers,
         shard_id=global_rank,
         num_shards=world_size,
-        source_uuids=val_uuids,
+        uuids_file=args.val_rows_fn,
         device_id=local_rank,
         seed=1234,
         crop=crop_size,
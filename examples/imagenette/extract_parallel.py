@@ -0,0 +1 @@
+../common/extract_parallel.py
\ No newline at end of file
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 # cassandra reader
-from cassandra_reader import get_cassandra_reader, read_uuids
+from cassandra_reader import get_cassandra_reader
 
 # dali
 from nvidia.dali.pipeline import pipeline_def
@@ -110,9 +110,6 @@ def read_data(
         device_id = types.CPU_ONLY_DEVICE_ID
 
     if reader == "cassandra":
-        source_uuids = read_uuids(
-            rows_fn,
-        )
         chosen_reader = get_cassandra_reader(
             data_table=data_table,
             prefetch_buffers=4,
@@ -122,7 +119,7 @@ def read_data(
             copy_threads=4,
             ooo=True,
             slow_start=4,
-            source_uuids=source_uuids,
+            uuids_file=rows_fn,
             shard_id=global_rank,
             num_shards=world_size,
         )
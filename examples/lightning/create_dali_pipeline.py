@@ -76,7 +76,7 @@ def create_dali_pipeline_cassandra(
     data_table,
     crop,
     size,
-    source_uuids,
+    uuids_file,
     shuffle_every_epoch=True,
     dali_cpu=False,
     is_training=True,
@@ -94,7 +94,7 @@ def create_dali_pipeline_cassandra(
         prefetch_buffers=prefetch_buffers,
         shard_id=shard_id,
         num_shards=num_shards,
-        source_uuids=source_uuids,
+        uuids_file=uuids_file,
         io_threads=io_threads,
         comm_threads=comm_threads,
         copy_threads=copy_threads,
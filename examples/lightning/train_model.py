@@ -3,7 +3,7 @@
 # (Apache License, Version 2.0)
 
 # cassandra reader
-from cassandra_reader import get_cassandra_reader, read_uuids
+from cassandra_reader import get_cassandra_reader
 from create_dali_pipeline import (
     create_dali_pipeline_from_file,
     create_dali_pipeline_cassandra,
@@ -491,8 +491,6 @@ class DALI_ImageNetLightningModel(ImageNetLightningModel):
                 data_table = args.val_data_table
                 rows_fn = args.val_rows_fn
 
-            in_uuids = read_uuids(rows_fn=rows_fn)
-
             pipe = create_dali_pipeline_cassandra(
                 batch_size=args.batch_size,
                 crop=args.crop_size,
@@ -507,7 +505,7 @@ class DALI_ImageNetLightningModel(ImageNetLightningModel):
                 shard_id=shard_id,
                 shuffle_every_epoch=True,
                 size=args.val_size,
-                source_uuids=in_uuids,
+                uuids_file=rows_fn,
             )
 
         pipe.build()
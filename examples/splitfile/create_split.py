@@ -41,6 +41,8 @@ def main(
     split_ofn: "o" = None,
     split_ratio: ("r", tolist) = [8, 2],
     balance: ("b", parse_balance) = "original",
+    kfold: "k" = 0,
+    seed: int = None,
 ):
     """
     Create Split: a splitfile generator starting from data stored on a Cassandra db.
@@ -52,6 +54,8 @@ def main(
     :param split_ofn: The name of the output splitfile
     :param split_ratio: a comma separated values list that specifies the data proportion among desired splits
     :param balance: balance configuration among classes for each split (it can be a string ('original', 'random') or a a comma separated values list with one entry for each class
+    :param kfold: if greater than zero, create this number of stratified folds instead of the splits
+    :param seed: seed of the random selection
     """
 
     isg = imagenet_split_generator()
@@ -71,8 +75,12 @@ def main(
         print(f"Saving metadata dataframe to {metadata_ofn}")
         isg.cache_db_data_to_file(metadata_ofn)
 
-    print(f"Creating {len(split_ratio)} splits")
-    isg.create_split(split_ratio, balance=balance)
+    if kfold > 0:
+        print(f"Creating {kfold} folds")
+        isg.create_kfold_split(kfold, seed=seed)
+    else:
+        print(f"Creating {len(split_ratio)} splits")
+        isg.create_split(split_ratio, balance=balance, seed=seed)
 
     if split_ofn:
         print(f"Saving splitfile: {split_ofn}")
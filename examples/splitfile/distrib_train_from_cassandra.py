@@ -4,14 +4,13 @@
 
 # cassandra reader
 from cassandra_reader import get_cassandra_reader
-from crs4.cassandra_utils import get_shard
+from crs4.cassandra_utils import get_shard, load_split_file
 
 import argparse
 import os
 import shutil
 import time
 import math
-import pickle
 
 import torch
 import torch.nn as nn
@@ -23,8 +22,6 @@ import torch.utils.data
 import torch.utils.data.distributed
 import torchvision.models as models
 
-import numpy as np
-
 try:
     from nvidia.dali.plugin.pytorch import DALIClassificationIterator, LastBatchPolicy
     from nvidia.dali.pipeline import pipeline_def
@@ -218,7 +215,8 @@ def create_dali_pipeline(
     data_col,
     crop,
     size,
-    source_uuids,
+    split_file,
+    split_index,
     dali_cpu=False,
     is_training=True,
     prefetch_buffers=8,
@@ -238,7 +236,8 @@ def create_dali_pipeline(
         prefetch_buffers=prefetch_buffers,
         shard_id=shard_id,
         num_shards=num_shards,
-        source_uuids=source_uuids,
+        split_file=split_file,
+        split_index=split_index,
         io_threads=io_threads,
         comm_threads=comm_threads,
         copy_threads=copy_threads,
@@ -294,16 +293,13 @@ def create_dali_pipeline(
 
 
 def read_split_file(split_fn):
-    data = pickle.load(open(split_fn, "rb"))
+    data = load_split_file(split_fn)
     data_table = data["data_table"]
     id_col = data["data_id_col"]
     label_col = data["data_label_col"]  # Name of the table column with the outcome label
     data_col = data["data_col"]  # Name of the table column with actual data
     label_type = data["label_type"]
-    row_keys = data["row_keys"]  # Numpy array of UUIDs
-    split = data[
-        "split"
-    ]  # List of arrays. Each arrays indexes the row_keys array for each split.
+    n_split = len(data["split"])  # Number of splits (arrays of row indexes)
     num_classes = data["num_classes"]
 
     return (
@@ -312,41 +308,38 @@ def read_split_file(split_fn):
         data_col,
         label_type,
         label_col,
-        row_keys,
-        split,
+        n_split,
         num_classes,
     )
 
 
-def compute_split_index(split, train_index, val_index, crossval_index, exclude_index):
-    n_split = len(split)
+def compute_split_index(n_split, train_index, val_index, crossval_index, exclude_index):
+    # Indexes of the splits to be read for training and validation, the
+    # reader merges them by itself
+    train_splits = [train_index]
+    val_splits = [val_index]
 
     # Merge splits for training samples if crossvalidation is requested.
     # Do nothing otherwise
-    if crossval_index and n_split > 2:
-        if exclude_index > n_split:
-            exlcude_index = n_split - 1
-        if crossval_index > n_split or crossval_index == exclude_index:
+    if crossval_index is not None and n_split > 2:
+        if exclude_index is not None and exclude_index >= n_split:
+            exclude_index = n_split - 1
+        if crossval_index >= n_split or crossval_index == exclude_index:
             crossval_index = n_split - 2
 
-        tis = np.array(
-            [i for i in range(n_split) if i != exclude_index and i != val_index]
-        )
-        train_split = np.concatenate([split[i] for i in tis])
-        val_split = split[val_index]
-
-        split = [train_split, val_split]
-        train_index = 0
-        val_index = 1
+        train_splits = [
+            i for i in range(n_split) if i != exclude_index and i != crossval_index
+        ]
+        val_splits = [crossval_index]
 
         print("\nCrossvalidation:")
-        print(f"Training samples will be taken from splits {tis}")
+        print(f"Training samples will be taken from splits {train_splits}")
         print(f"Validation samples will be taken from split {crossval_index}")
-        if exclude_index:
+        if exclude_index is not None:
             print(f"Split {exclude_index} will not be used")
         print("\n")
 
-    return split, train_index, val_index
+    return train_splits, val_splits
 
 
 def main():
@@ -361,14 +354,13 @@ def main():
         data_col,
         label_type,
         label_col,
-        row_keys,
-        split,
+        n_split,
         num_classes,
     ) = read_split_file(args.split_fn)
 
     # Get split indexes
-    split, train_index, val_index = compute_split_index(
-        split, args.train_index, args.val_index, args.crossval_index, args.exclude_index
+    train_splits, val_splits = compute_split_index(
+        n_split, args.train_index, args.val_index, args.crossval_index, args.exclude_index
     )
 
     # test mode, use default args for sanity test
@@ -513,9 +505,6 @@ def main():
         val_size = 256
 
     # train pipe
-    train_uuids = row_keys[split[train_index]]
-    train_uuids = list(train_uuids)
-
     pipe = create_dali_pipeline(
         data_table=data_table,
         id_col=id_col,
@@ -526,7 +515,8 @@ def main():
         num_threads=args.workers,
         shard_id=global_rank,
         num_shards=world_size,
-        source_uuids=train_uuids,
+        split_file=args.split_fn,
+        split_index=train_splits,
         device_id=local_rank,
         seed=1234,
         crop=crop_size,
@@ -541,8 +531,6 @@ def main():
     )
 
     # val pipe
-    val_uuids = row_keys[split[val_index]]
-    val_uuids = list(val_uuids)
     pipe = create_dali_pipeline(
         data_table=data_table,
         id_col=id_col,
@@ -553,7 +541,8 @@ def main():
         num_threads=args.workers,
         shard_id=global_rank,
         num_shards=world_size,
-        source_uuids=val_uuids,
+        split_file=args.split_fn,
+        split_index=val_splits,
         device_id=local_rank,
         seed=1234,
         crop=crop_size,
@@ -14,6 +14,7 @@
 
 # cassandra reader
 from cassandra_reader import get_cassandra_reader
+from crs4.cassandra_utils import load_split_file
 
 # dali
 from nvidia.dali.pipeline import pipeline_def
@@ -34,7 +35,6 @@ from fn_shortcuts import (
 # varia
 from clize import run
 from tqdm import trange, tqdm
-import pickle
 import math
 
 # supporting torchrun
@@ -61,12 +61,8 @@ def read_data(
     else:
         device_id = types.CPU_ONLY_DEVICE_ID
 
-    data = pickle.load(open(split_fn, "rb"))
+    data = load_split_file(split_fn)
     data_table = data["data_table"]
-    row_keys = data["row_keys"]
-    split = data["split"]
-    source_uuids = row_keys[split[use_index]]
-    source_uuids = list(source_uuids)
 
     bs = 128
     chosen_reader = get_cassandra_reader(
@@ -78,7 +74,8 @@ def read_data(
         copy_threads=4,
         ooo=True,
         slow_start=4,
-        source_uuids=source_uuids,
+        split_file=split_fn,
+        split_index=[use_index],
         shard_id=global_rank,
         num_shards=world_size,
     )
@@ -0,0 +1,196 @@
+# Copyright 2022 CRS4 (http://www.crs4.it/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from crs4.cassandra_utils import _cassandra_writer
+from crs4.cassandra_utils._cassandra_classification_writer import (
+    CassandraClassificationWriter,
+)
+from crs4.cassandra_utils._cassandra_writer import CassandraWriter
+from crs4.cassandra_utils._manifest import IngestManifest
+
+
+class StubFuture:
+    def __init__(self, prep, args):
+        self.prep = prep
+        self.args = args
+        self.callbacks = None
+
+    def add_callbacks(self, callback, errback, callback_args, errback_args):
+        self.callbacks = (callback, errback, callback_args, errback_args)
+
+    def complete(self, error=None):
+        # callbacks run on another thread, as with the driver event loop
+        callback, errback, callback_args, errback_args = self.callbacks
+        if error is None:
+            t = threading.Thread(target=callback, args=(None, *callback_args))
+        else:
+            t = threading.Thread(target=errback, args=(error, *errback_args))
+        t.start()
+        t.join()
+
+
+class StubSession:
+    def __init__(self):
+        self.futures = []
+        self._lock = threading.Lock()
+
+    def prepare(self, query):
+        return query
+
+    def execute_async(self, prep, args, **kwargs):
+        future = StubFuture(prep, args)
+        with self._lock:
+            self.futures.append(future)
+        return future
+
+
+class StubCassandraSession:
+    def __init__(self, cass_conf):
+        self.sess = StubSession()
+
+
+@pytest.fixture(autouse=True)
+def stub_session(monkeypatch):
+    monkeypatch.setattr(_cassandra_writer, "CassandraSession", StubCassandraSession)
+
+
+def make_writer(max_inflight=4, max_inflight_bytes=100):
+    return CassandraWriter(
+        None,
+        "ks.data",
+        "ks.meta",
+        "id",
+        "label",
+        "data",
+        [],
+        None,
+        max_inflight=max_inflight,
+        max_inflight_bytes=max_inflight_bytes,
+    )
+
+
+def wait_sent(sess, n, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(sess.futures) < n:
+        assert time.monotonic() < deadline, "write not sent"
+        time.sleep(0.01)
+
+
+def in_background(fn, *args, **kwargs):
+    t = threading.Thread(target=fn, args=args, kwargs=kwargs, daemon=True)
+    t.start()
+    return t
+
+
+def test_max_inflight():
+    w = make_writer(max_inflight=2)
+    w.write_async("q", ())
+    w.write_async("q", ())
+    t = in_background(w.write_async, "q", ())
+    time.sleep(0.1)
+    assert len(w.sess.futures) == 2
+    w.sess.futures[0].complete()
+    wait_sent(w.sess, 3)
+    t.join()
+    for f in w.sess.futures[1:]:
+        f.complete()
+    w.flush()
+    assert w._inflight == 0
+
+
+def test_max_inflight_bytes():
+    w = make_writer(max_inflight=10, max_inflight_bytes=100)
+    w.write_async("q", (), nbytes=60)
+    t = in_background(w.write_async, "q", (), nbytes=60)
+    time.sleep(0.1)
+    assert len(w.sess.futures) == 1
+    w.sess.futures[0].complete()
+    wait_sent(w.sess, 2)
+    t.join()
+    w.sess.futures[1].complete()
+    w.flush()
+    assert w._inflight_bytes == 0
+
+
+def test_oversized_write():
+    w = make_writer(max_inflight=10, max_inflight_bytes=100)
+    # admitted alone, even if larger than the window
+    w.write_async("q", (), nbytes=1000)
+    assert len(w.sess.futures) == 1
+    t = in_background(w.write_async, "q", (), nbytes=10)
+    time.sleep(0.1)
+    assert len(w.sess.futures) == 1
+    w.sess.futures[0].complete()
+    wait_sent(w.sess, 2)
+    t.join()
+    w.sess.futures[1].complete()
+    w.flush()
+
+
+def test_flush_raises_first_error():
+    w = make_writer()
+    w.write_async("q", ())
+    w.write_async("q", ())
+    w.sess.futures[0].complete(error=RuntimeError("first"))
+    w.sess.futures[1].complete(error=RuntimeError("second"))
+    with pytest.raises(RuntimeError, match="first"):
+        w.flush()
+    # the error is reported once
+    w.flush()
+
+
+def test_failed_item_not_committed(tmp_path):
+    manifest = str(tmp_path / "manifest.txt")
+    w = CassandraClassificationWriter(
+        None,
+        "ks.data",
+        "ks.meta",
+        "id",
+        "label",
+        "data",
+        [],
+        None,
+        max_inflight=1,
+        manifest=manifest,
+    )
+    id0, id1 = uuid.uuid4(), uuid.uuid4()
+    # the metadata insert waits for room in the window, while the data
+    # insert succeeds
+    t = in_background(w.enqueue_item, (id0, 0, b"x" * 10, ()))
+    wait_sent(w.sess, 1)
+    w.sess.futures[0].complete()
+    wait_sent(w.sess, 2)
+    t.join()
+    meta0 = w.sess.futures[1]
+    assert meta0.prep == w.prep_meta
+    meta0.complete(error=RuntimeError("metadata insert failed"))
+    with pytest.raises(RuntimeError):
+        w.flush()
+    t = in_background(w.enqueue_item, (id1, 1, b"y" * 10, ()))
+    for n in (3, 4):
+        wait_sent(w.sess, n)
+        w.sess.futures[n - 1].complete()
+    t.join()
+    w.flush()
+    done = IngestManifest(manifest)
+    assert id0 not in done
+    assert id1 in done
+    with open(manifest) as fh:
+        assert fh.read().split() == [id1.hex]